@@ -1,24 +1,66 @@
 import argparse
-import asyncio
-import inspect
+import io
 import os
-import shlex
 import sys
+import threading
 import typing
-import uuid
 from argparse import Action, ArgumentParser
-from typing import Any, Callable, Dict, List, Optional, Text, Tuple, Union, cast
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+if TYPE_CHECKING:
+    import inspect
 
+from . import hooks
 from .actions import BoolAction, TupleAction, TypedChoiceAction
+from .results import BatchResult, Invocation
+from .runner import (
+    LoopRunner,
+    is_coroutine_function,
+    is_loop_running,
+    shared_runner,
+)
+from .cache import BuiltParser, ParserCache, ResultCache, freeze, parser_cache
+from .dispatch import DispatchPlan
+from .native import NativeParser
+from .spec import (
+    ArgumentSpec,
+    CommandSpec,
+    SpecCache,
+    encode_for_key,
+    fingerprint,
+    object_ref,
+)
+from .tokenizer import Tokenizer
 from .base import (
     ArgParser,
+    ArgTyperAttribute,
     Argument,
     Command,
     SubCommand,
     SubParser,
     ArgumentGroup,
     MutuallyExclusiveArgumentGroup,
-    remove_uuid4_prefix,
+    DEFAULT,
+    OutputSink,
+    output_sink,
+    get_dest,
+    remove_dest_prefix,
     change_metavar,
 )
 from .exceptions import (
@@ -26,6 +68,7 @@ from .exceptions import (
     ArgParserExitException,
     ArgTyperException,
     ArgTyperArgumentException,
+    SpecCacheException,
 )
 
 
@@ -48,6 +91,38 @@ class ArgTyper:
                 So, this will always overwrite defaults set somewhere else.
         version: If provided, the ``--version`` and ``-v`` arguments will be added and will print the
                 provided version string. ``%(prog)s`` can be used to reference the current program name
+        lazy_subcommands: If set to ``True``, only the parser of ``func`` is created up front. The parsers of
+                subcommands are only filled with their arguments the first time they are selected on the
+                command line (or their help is shown). This speeds up large command trees considerably.
+        cache_parser: If set to ``True``, the parser is shared with all other ArgTyper instances for the same
+                function and configuration through :py:data:`argtyper.cache.parser_cache`.
+                Use :py:meth:`argtyper.cache.ParserCache.invalidate` to remove parsers from the cache.
+        spec_cache: Path to a file used to cache the specification of the parser between runs. If the file is
+                up to date, the parser is created from it, without inspecting the functions again.
+                Otherwise, the file will be (re)created.
+        persistent_loop: If set to ``True``, coroutine functions called by :py:meth:`call_parser_sync` run on a
+                single event loop owned by this instance (in a background thread), instead of a new event loop
+                for every call. Use :py:meth:`close` to stop the loop.
+                Without it, coroutine functions called by :py:meth:`call_parser_sync` while an event loop is
+                running in the current thread run on a single background loop shared by all ArgTyper instances.
+        tokenizer_cache: Number of recently split messages (see :py:meth:`__call__`) to remember, so repeated
+                messages are not split again. ``0`` (default) disables the cache
+        result_cache: Number of recently parsed argument lists to remember together with the resulting function calls.
+                Repeated input then skips the parser and only calls the functions. ``0`` (default) disables the cache.
+                See :py:class:`argtyper.cache.ResultCache` and ``cache_results`` of :class:`argtyper.Command`
+        native_parser: If set to ``True``, argument lists are parsed with :py:class:`argtyper.native.NativeParser`,
+                which falls back to argparse for input it does not handle. The results are the same, but parsing
+                is faster.
+        subcommand_prefixes: If set to ``True``, subcommands can also be selected by a unique prefix of their name,
+                like abbreviated options. Prefixes matching more than one subcommand are an error.
+        cache_help: If set to ``True`` (and ``spec_cache`` is set), the help and usage messages of all parsers which
+                exist when the ``spec_cache`` file is written are rendered and stored in the file. On later runs,
+                showing them does not need to run the help formatter of argparse. Messages are always rendered
+                only once per parser, independent of this setting
+        output: Where help, usage and version messages of the parser are written while parsing: a stream
+                (anything with a ``write()`` method) or a callable, which is called with every message.
+                If set to `None` (default), the messages of each call are collected and stored as ``output`` of the
+                raised :py:class:`argtyper.exceptions.ArgParserExitException` (or ArgParserException)
     """
 
     def __init__(
@@ -60,6 +135,16 @@ class ArgTyper:
         hardcoded_types: Dict[Any, Any] = None,
         arg_defaults: Dict[str, Any] = None,
         version: Optional[str] = None,
+        lazy_subcommands: bool = False,
+        cache_parser: bool = False,
+        spec_cache: Optional[Union[str, "os.PathLike[str]"]] = None,
+        persistent_loop: bool = False,
+        tokenizer_cache: int = 0,
+        result_cache: int = 0,
+        native_parser: bool = False,
+        subcommand_prefixes: bool = False,
+        cache_help: bool = False,
+        output: OutputSink = None,
     ):
         self.command_function = func
         arg_command = Command.get_or_create(func)
@@ -67,7 +152,7 @@ class ArgTyper:
             progname if progname != None else arg_command.arg_options["prog"]
         )
         self.parser = None
-        self.remapped_parameters: Dict[str, str] = {}
+        self.dispatch_plan = DispatchPlan()
         self.progname = progname
         self.subparser_level = 0
         self.ignore_args = ignore_args or []
@@ -76,9 +161,28 @@ class ArgTyper:
         self.hardcoded_types = hardcoded_types or {}
         self.arg_defaults = arg_defaults or {}
         self.version = version
+        self.lazy_subcommands = lazy_subcommands
+        self.cache_parser = cache_parser
+        self.spec_cache = spec_cache
+        self.persistent_loop = persistent_loop
+        self._loop_runner = LoopRunner() if persistent_loop else None
+        self.tokenizer = Tokenizer(tokenizer_cache)
+        self.result_cache = ResultCache(result_cache) if result_cache else None
+        self.native_parser = native_parser
+        self._native: Optional[NativeParser] = None
+        self.subcommand_prefixes = subcommand_prefixes
+        self._build_lock = threading.Lock()
+        self.cache_help = cache_help
+        self._preload_help = False
+        self.output = output
 
     def _parse_parameter(
-        self, name: str, param: inspect.Parameter, arg_command: Command, prefix: str
+        self,
+        name: str,
+        param: "inspect.Parameter",
+        arg_command: Command,
+        prefix: str,
+        hardcoded: Dict[str, Any],
     ) -> Optional[Tuple[str, Dict]]:
 
         parser_options = dict()
@@ -109,11 +213,11 @@ class ArgTyper:
         origin_type = cast(Any, origin_type)
 
         if name in hardcoded_names:
-            arg_command.hardcoded_args[name] = hardcoded_names[name]
+            hardcoded[name] = None
             return None
 
         if origin_type in hardcoded_types:
-            arg_command.hardcoded_args[name] = hardcoded_types[origin_type]
+            hardcoded[name] = origin_type
             return None
 
         # Ignore those parameter names
@@ -179,33 +283,38 @@ class ArgTyper:
 
         return param_name, parser_options
 
-    def _get_param_defaults(self, func: Callable, name: str) -> Optional[Argument]:
-        defaults = Argument.get(func)
-        if defaults:
-            return defaults.get(name, None)
-        return None
+    @staticmethod
+    def _get_arg_groups(attributes: Dict) -> List:
+        """ The argument groups of a command, taken from the result of ArgTyperAttribute.get_all """
+        return attributes.get(ArgumentGroup, []) + attributes.get(
+            MutuallyExclusiveArgumentGroup, []
+        )
 
     def _prepare_parameter(
         self,
-        parser: Union[ArgParser, ArgumentParser],
+        prefix_chars: str,
         param_name: str,
-        param: inspect.Parameter,
+        param: "inspect.Parameter",
         func: Callable,
         arg_command: Command,
-    ) -> Optional[Dict]:
+        spec: CommandSpec,
+        attributes: Optional[Dict] = None,
+    ) -> Optional[ArgumentSpec]:
+        if attributes is None:
+            attributes = ArgTyperAttribute.get_all(func)
 
+        start = perf_counter() if hooks.observers else None
         result = self._parse_parameter(
-            param_name, param, arg_command, parser.prefix_chars
+            param_name, param, arg_command, prefix_chars, spec.hardcoded
         )
-        remapped_parameters: Dict[str, str] = {}
+        if start is not None:
+            hooks.emit("parameter", spec.path, perf_counter() - start, param_name)
 
         if not result:
             return None
 
-        unique_name = f"{uuid.uuid4().hex}_{param_name}"
-        # arg_command.handled_args.append(name)
-        arg_command.handled_args.append(unique_name)
-        defaults = self._get_param_defaults(func, param_name)
+        unique_name = get_dest(spec.path, param_name)
+        defaults = attributes.get(Argument, {}).get(param_name, None)
 
         name, kwargs = result
         name_or_flags: Tuple[str, ...] = (name,)
@@ -213,10 +322,9 @@ class ArgTyper:
         if defaults:
             if defaults.arg_names:
 
-                remapped_parameters = {
-                    k.lstrip(parser.prefix_chars): unique_name
-                    for k in defaults.arg_names
-                }
+                spec.remapped_parameters.update(
+                    {k.lstrip(prefix_chars): unique_name for k in defaults.arg_names}
+                )
 
                 name_or_flags = defaults.arg_names
 
@@ -227,42 +335,120 @@ class ArgTyper:
             change_metavar(kwargs, "upper")
             kwargs["dest"] = unique_name
         else:
-            if name_or_flags[0].startswith(parser.prefix_chars[0]):
+            if name_or_flags[0].startswith(prefix_chars[0]):
                 kwargs["dest"] = unique_name
                 change_metavar(kwargs, "upper")
             else:
                 name_or_flags = (unique_name,)
                 change_metavar(kwargs, "upper")
 
-        arg_groups = ArgumentGroup.get(
-            func, default=[]
-        ) + MutuallyExclusiveArgumentGroup.get(func, default=[])
-        in_group = False
-        try:
-            for arg_group in arg_groups:
-                if param_name in arg_group.arguments:
-                    group = arg_group.get_group(parser)
-                    group.add_argument(*name_or_flags, **kwargs)
-                    in_group = True
-        except ValueError as e:
-            raise ArgTyperArgumentException(func, name, str(e)) from e
-
-        if not in_group:
-            parser.add_argument(*name_or_flags, **kwargs)
-        return remapped_parameters
+        arg_groups = self._get_arg_groups(attributes)
+        groups = [
+            index
+            for index, arg_group in enumerate(arg_groups)
+            if param_name in arg_group.arguments
+        ]
+        return ArgumentSpec(param_name, unique_name, name_or_flags, kwargs, groups)
+
+    def _inspect_command(
+        self, func: Callable, arg_command: Command, prefix_chars: str, spec: CommandSpec
+    ) -> None:
+        """ Create the specification of all arguments of a function from its signature """
+        import inspect
+
+        start = perf_counter() if hooks.observers else None
+        sig = inspect.Signature.from_callable(func)
+        spec.module = getattr(func, "__module__", None)
+        spec.arguments = []
+        attributes = ArgTyperAttribute.get_all(func)
+        if start is not None:
+            hooks.emit("signature", spec.path, perf_counter() - start)
+        for name, param in sig.parameters.items():
+            argument = self._prepare_parameter(
+                prefix_chars, name, param, func, arg_command, spec, attributes
+            )
+            if argument:
+                spec.arguments.append(argument)
+
+    def _apply_command_spec(
+        self,
+        func: Callable,
+        parser: ArgumentParser,
+        arg_command: Command,
+        spec: CommandSpec,
+    ) -> None:
+        """ Add the arguments of a command specification to its parser and the dispatch plan """
+        plan = self.dispatch_plan
+        subcommand_level = len(spec.path)
+        # Handle "parents=" arguments
+        for act in parser._actions:
+            plan.add_argument(act.dest, subcommand_level, remove_dest_prefix(act.dest))
+
+        # Python >= 3.9
+        hardcoded_names = self.hardcoded_names | arg_command.hardcoded_names
+        hardcoded_types = self.hardcoded_types | arg_command.hardcoded_types
+        hardcoded_args = dict()
+        for name, hardcoded_type in spec.hardcoded.items():
+            if hardcoded_type is None:
+                hardcoded_args[name] = hardcoded_names[name]
+            else:
+                hardcoded_args[name] = hardcoded_types[hardcoded_type]
+        plan.add_hardcoded(arg_command, hardcoded_args)
+
+        # TODO was there a reason this was here and hardcoded? Hmmm....
+        # parser.allow_abbrev = False
+
+        arg_groups = self._get_arg_groups(ArgTyperAttribute.get_all(func))
+        for argument in cast(List[ArgumentSpec], spec.arguments):
+            plan.add_argument(argument.dest, subcommand_level, argument.param_name)
+            start = perf_counter() if hooks.observers else None
+            try:
+                for index in argument.groups:
+                    group = arg_groups[index].get_group(parser)
+                    group.add_argument(*argument.name_or_flags, **argument.options)
+            except ValueError as e:
+                raise ArgTyperArgumentException(
+                    func, argument.name_or_flags[0], str(e)
+                ) from e
+
+            if not argument.groups:
+                parser.add_argument(*argument.name_or_flags, **argument.options)
+            if start is not None:
+                hooks.emit(
+                    "add_argument",
+                    spec.path,
+                    perf_counter() - start,
+                    argument.param_name,
+                )
+        for alias, dest in spec.remapped_parameters.items():
+            plan.add_alias(alias, dest)
 
     def _prepare_subcommands(
-        self, func: Callable, parser: ArgumentParser, subcommand_level: int
+        self,
+        func: Callable,
+        parser: ArgumentParser,
+        subcommand_level: int,
+        spec: CommandSpec,
     ) -> None:
         subcommands = SubCommand.get(func, default=[])
         subcommands = cast(List[SubCommand], subcommands)
         if not subcommands:
             return
+        start = perf_counter() if hooks.observers else None
         subparser_info = SubParser.get_or_create(func)
-        subparsers = subparser_info.add_subparser_to_parser(parser)
+        subparsers = subparser_info.add_subparser_to_parser(
+            parser, prefixes=self.subcommand_prefixes
+        )
         for subcommand in subcommands:
             subfunc = subcommand.get_subfunction(func)
-            self._prepare_parser(subfunc, subparsers, subcommand.name, subcommand_level)
+            subspec = spec.subcommands.setdefault(
+                subcommand.name, CommandSpec(spec.path + (subcommand.name,))
+            )
+            self._prepare_parser(
+                subfunc, subparsers, subcommand.name, subcommand_level, subspec
+            )
+        if start is not None:
+            hooks.emit("subcommands", spec.path, perf_counter() - start)
 
     def _prepare_parser(
         self,
@@ -270,138 +456,510 @@ class ArgTyper:
         subparsers: Optional[Action] = None,
         subcommand_name: Optional[str] = None,
         subcommand_level: int = 0,
+        spec: Optional[CommandSpec] = None,
     ) -> None:
-        if self.parser:
-            return
-        sig = inspect.Signature.from_callable(func)
+        if not subcommand_level:
+            if self.parser or self._load_cached_parser():
+                return
+            spec = self._load_spec()
+            spec_loaded = spec is not None
+            self._preload_help = (
+                spec_loaded
+                and self.cache_help
+                and spec.formatted_key == self._formatted_key()
+            )
+        spec = spec or CommandSpec()
+
         arg_command = Command.get_or_create(func)
         # arg_command = self._get_argtyper_command(func)
         if subparsers:
             parser = arg_command.set_as_subparser(subparsers, subcommand_name)
             parser.set_defaults(**arg_command.arg_defaults)
-            function = {f"_argtyper_function_{subcommand_level}": func}
-            parser.set_defaults(**function)
+            function_key = self.dispatch_plan.add_function(subcommand_level)
+            parser.set_defaults(**{function_key: func})
         else:
             parser = arg_command.get_argparser()
             parser.set_defaults(**arg_command.arg_defaults)
+        self.dispatch_plan.add_path(func, spec.path)
 
         parser.set_defaults(**self.arg_defaults)
         parser.prog = parser.prog if parser.prog != None else func.__name__
-
-        remapped_parameters: Dict = dict()
-
-        # Handle "parents=" arguments
-        for act in parser._actions:
-            arg_command.handled_args.append(act.dest)
-
-        # TODO was there a reason this was here and hardcoded? Hmmm....
-        # parser.allow_abbrev = False
-
-        for name, param in sig.parameters.items():
-            new_remapped_parameters = self._prepare_parameter(
-                parser, name, param, func, arg_command
+        if self._preload_help and spec.formatted and isinstance(parser, ArgParser):
+            parser.preload_formatted(spec.formatted)
+
+        if subcommand_level and self.lazy_subcommands and isinstance(parser, ArgParser):
+            # Only the name (and help) of the subcommand is needed for the listing of the parent parser.
+            # Everything else is added as soon as the subcommand is selected on the command line
+            parser.defer(
+                lambda: self._populate_parser(
+                    func, parser, arg_command, subcommand_level, spec
+                )
             )
-            if new_remapped_parameters:
-                remapped_parameters.update(new_remapped_parameters)
-        self._prepare_subcommands(func, parser, subcommand_level + 1)
-        self.remapped_parameters.update(remapped_parameters)
+        else:
+            self._populate_parser(func, parser, arg_command, subcommand_level, spec)
 
         if not subcommand_level:
             # parser.set_defaults(**self.arg_defaults)
-            self.parser = parser
             if self.version:
-                self.parser.add_argument(
+                parser.add_argument(
                     "--version", "-v", action="version", version=self.version
                 )
+            if not spec_loaded:
+                self._store_spec(func, parser, spec)
+            # Set last, since other threads use the parser as soon as it is set (see _ensure_parser)
+            self.parser = parser
+            self._store_cached_parser()
 
-    def _parse_command(self, current_function: Callable, unhandled: Dict):
-        """ Parse an argcommand and return the arguments handled by this command """
-        arg_command = Command.get(current_function, raise_exc=True)
+    def _populate_parser(
+        self,
+        func: Callable,
+        parser: ArgumentParser,
+        arg_command: Command,
+        subcommand_level: int,
+        spec: CommandSpec,
+    ) -> None:
+        """ Add the parameters and subcommands of a function to its (sub)parser """
+        start = perf_counter() if hooks.observers else None
+        if spec.arguments is None:
+            self._inspect_command(func, arg_command, parser.prefix_chars, spec)
+        self._apply_command_spec(func, parser, arg_command, spec)
+        self._prepare_subcommands(func, parser, subcommand_level + 1, spec)
+        if start is not None:
+            hooks.emit("command", spec.path, perf_counter() - start)
+
+    def _spec_key(self) -> str:
+        """ Identifies the function and the configuration (which influence the parser) of this instance """
+        func = self.command_function
+        return fingerprint(
+            getattr(func, "__module__", None),
+            getattr(func, "__qualname__", None),
+            sorted(self.ignore_args),
+            [object_ref(t) or repr(t) for t in self.ignore_types],
+            sorted(self.hardcoded_names),
+            [object_ref(t) or repr(t) for t in self.hardcoded_types],
+            self._collect_defaults(func),
+        )
 
-        handled_args = {
-            remove_uuid4_prefix(k): v
-            for k, v in unhandled.items()
-            if k in arg_command.handled_args
-        }
-        handled_args = handled_args | arg_command.hardcoded_args
-        unhandled = {
-            k: v for k, v in unhandled.items() if k not in arg_command.handled_args
-        }
-        return handled_args, unhandled
-
-    def _parse_subcommands(self, unhandled) -> List:
-        """ Parse SubCommands for a Command """
-        subfunctions = [
-            int(x.removeprefix("_argtyper_function_"))
-            for x in unhandled
-            if x.startswith("_argtyper_function_")
+    def _collect_defaults(self, func: Callable, path: Tuple[str, ...] = ()) -> List:
+        """The defaults of the parameters and the options of :py:class:`Argument` of all commands
+
+        They can be computed at import time (e.g. from environment variables), so a cached spec is only valid for
+        the same values.
+        """
+        arguments = Argument.get(func, default={})
+        defaults = [
+            (
+                path,
+                encode_for_key(getattr(func, "__defaults__", None)),
+                encode_for_key(getattr(func, "__kwdefaults__", None)),
+                [
+                    (
+                        reference,
+                        encode_for_key(arguments[reference].get_set_options()),
+                        encode_for_key(arguments[reference].kwargs),
+                    )
+                    for reference in sorted(arguments)
+                ],
+            )
         ]
-        if not subfunctions:
-            return []
-        calls = []
-        next_func_number = sorted(subfunctions)[0]
-        current_function = unhandled.pop(f"_argtyper_function_{next_func_number}")
+        for subcommand in SubCommand.get(func, default=[]):
+            defaults.extend(
+                self._collect_defaults(
+                    subcommand.get_subfunction(func), path + (subcommand.name,)
+                )
+            )
+        return defaults
 
-        handled, unhandled = self._parse_command(current_function, unhandled)
-        calls.append((current_function, handled))
+    def _load_spec(self) -> Optional[CommandSpec]:
+        if not self.spec_cache:
+            return None
+        return SpecCache(self.spec_cache).load(self._spec_key())
 
-        sub_calls = self._parse_subcommands(unhandled)
-        calls.extend(sub_calls)
-        return calls
+    def _complete_spec(
+        self, func: Callable, prefix_chars: str, spec: CommandSpec
+    ) -> None:
+        """ Inspect all commands which have not been inspected yet (e.g. because they are created lazily) """
+        arg_command = Command.get_or_create(func)
+        if spec.arguments is None:
+            self._inspect_command(func, arg_command, prefix_chars, spec)
+        for subcommand in SubCommand.get(func, default=[]):
+            subfunc = subcommand.get_subfunction(func)
+            subspec = spec.subcommands.setdefault(
+                subcommand.name, CommandSpec(spec.path + (subcommand.name,))
+            )
+            sub_prefix_chars = Command.get_or_create(subfunc).arg_options[
+                "prefix_chars"
+            ]
+            if isinstance(sub_prefix_chars, DEFAULT):
+                sub_prefix_chars = "-"
+            self._complete_spec(subfunc, sub_prefix_chars, subspec)
+
+    def _formatted_key(self) -> str:
+        """ Identifies the configuration, which influences the help messages but not the spec itself """
+        return fingerprint(
+            self.progname,
+            self.version,
+            sorted((repr(k), repr(v)) for k, v in self.arg_defaults.items()),
+            self.subcommand_prefixes,
+        )
+
+    def _collect_formatted(self, parser: ArgumentParser, spec: CommandSpec) -> None:
+        """ Render the help messages of all parsers which are already populated and add them to their spec """
+        if not isinstance(parser, ArgParser) or parser._pending:
+            return
+        parser.format_usage()
+        parser.format_help()
+        spec.formatted = parser.get_formatted()
+        for action in parser._subparsers_actions:
+            for name, subparser in action._name_parser_map.items():  # type: ignore
+                if name in spec.subcommands:
+                    self._collect_formatted(subparser, spec.subcommands[name])
+
+    def _store_spec(self, func: Callable, parser: ArgumentParser, spec: CommandSpec) -> None:
+        if not self.spec_cache:
+            return
+        self._complete_spec(func, parser.prefix_chars, spec)
+        if self.cache_help:
+            self._collect_formatted(parser, spec)
+            spec.formatted_key = self._formatted_key()
+        try:
+            SpecCache(self.spec_cache).store(self._spec_key(), spec)
+        except (SpecCacheException, OSError):
+            # The cache is optional. If it can't be written, we simply inspect everything on the next run again
+            pass
+
+    def _cache_config(self) -> Optional[Tuple]:
+        """ The key for the parser cache. `None` if the configuration can't be used as key """
+        config = (
+            self.progname,
+            freeze(self.ignore_args),
+            freeze(self.ignore_types),
+            freeze(self.hardcoded_names),
+            freeze(self.hardcoded_types),
+            freeze(self.arg_defaults),
+            self.version,
+            self.lazy_subcommands,
+            self.subcommand_prefixes,
+        )
+        try:
+            hash((self.command_function, config))
+        except TypeError:
+            return None
+        return config
+
+    def _load_cached_parser(self) -> bool:
+        if not self.cache_parser:
+            return False
+        config = self._cache_config()
+        if config is None:
+            return False
+        entry = parser_cache.get(self.command_function, config)
+        if not entry:
+            return False
+        self.dispatch_plan = entry.dispatch_plan
+        self.parser = entry.parser
+        return True
+
+    def _store_cached_parser(self) -> None:
+        if not self.cache_parser:
+            return
+        config = self._cache_config()
+        if config is None:
+            return
+        entry = BuiltParser(self.parser, self.dispatch_plan)
+        parser_cache.put(self.command_function, config, entry)
 
     def get_parser(self):
         """ Prepare and return the ArgumentParser instance """
-        self._prepare_parser(self.command_function)
+        self._ensure_parser()
         return self.parser
 
+    def _ensure_parser(self) -> None:
+        """ Create the parser once, even if the first calls come from several threads at the same time """
+        if self.parser is not None:
+            return
+        with self._build_lock:
+            if self.parser is None:
+                self._prepare_parser(self.command_function)
+
     def get_function_calls(self, input_args) -> List[Tuple[Callable, Dict[str, Any]]]:
         """ Run the parser on the input and return a List with a mapping of (function , kwargs) for matches"""
-        calls: List = []
         if not self.parser:
             raise ArgTyperException("Parser not set up. This should not happen here")
-        args = self.parser.parse_args(input_args)
-        # Remap arguments
-        for arg in list(args.__dict__.keys()):
-            if arg in self.remapped_parameters:
-                setattr(args, self.remapped_parameters[arg], getattr(args, arg))
-                delattr(args, arg)
-
-        handled, unhandled = self._parse_command(self.command_function, vars(args))
-        calls.append((self.command_function, handled))
-        sub_calls = self._parse_subcommands(unhandled)
-        calls.extend(sub_calls)
+        cache = self.result_cache
+        if cache is None or input_args is None:
+            return self._parse_calls(input_args)
+
+        calls = cache.get(input_args)
+        if calls is None:
+            calls = self._parse_calls(input_args)
+            if self._is_cacheable(calls):
+                hardcoded = self.dispatch_plan.hardcoded_args
+                cache.put(
+                    input_args,
+                    calls,
+                    [hardcoded.get(Command.get(func, raise_exc=True), ()) for func, _ in calls],
+                )
         return calls
 
-    def call_parser_sync(self, input_args: List[str]) -> List:
-        """ Run the parser on the input arguments and execute the corresponding functions """
-        self._prepare_parser(self.command_function)
+    def _parse_calls(
+        self, input_args: Optional[List[str]]
+    ) -> List[Tuple[Callable, Dict[str, Any]]]:
+        if not hooks.observers:
+            args = self._parse_args(input_args)
+            return self.dispatch_plan.get_function_calls(
+                self.command_function, vars(args)
+            )
 
-        responses = []
-        calls = self.get_function_calls(input_args)
+        start = perf_counter()
+        try:
+            args = self._parse_args(input_args)
+        except Exception:
+            hooks.emit("parse", (), perf_counter() - start)
+            raise
+        parsed = perf_counter()
+        calls = self.dispatch_plan.get_function_calls(self.command_function, vars(args))
+        path = self.dispatch_plan.get_path(calls[-1][0])
+        hooks.emit("parse", path, parsed - start)
+        hooks.emit("remap", path, perf_counter() - parsed)
+        return calls
 
+    def _parse_args(self, input_args: Optional[List[str]]) -> argparse.Namespace:
+        token = output_sink.set(self.output)
+        try:
+            if not self.native_parser:
+                return self.parser.parse_args(input_args)
+            if self._native is None or self._native.parser is not self.parser:
+                self._native = NativeParser(self.parser)
+            return self._native.parse_args(input_args)
+        finally:
+            output_sink.reset(token)
+
+    def _is_cacheable(self, calls: List[Tuple[Callable, Dict[str, Any]]]) -> bool:
         for func, kwargs in calls:
-            if inspect.iscoroutinefunction(func):
-                response = asyncio.run(func(**kwargs))
+            command = Command.get(func, raise_exc=True)
+            if not command.cache_results:
+                return False
+            hardcoded = self.dispatch_plan.hardcoded_args.get(command, {})
+            for name, value in kwargs.items():
+                if name in hardcoded:
+                    continue
+                # Files opened by the parser (e.g. argparse.FileType) can't be reused
+                if name in command.uncached_args or isinstance(value, io.IOBase):
+                    return False
+        return True
+
+    def _run_calls_sync(self, calls: List[Tuple[Callable, Dict[str, Any]]]) -> List:
+        responses = []
+        for func, kwargs in calls:
+            start = perf_counter() if hooks.observers else None
+            if is_coroutine_function(func):
+                response = self._run_coroutine(func(**kwargs))
             else:
                 response = func(**kwargs)
+            if start is not None:
+                self._emit_dispatch(func, start)
             responses.append(response)
         return responses
 
+    def _emit_dispatch(self, func: Callable, start: float) -> None:
+        hooks.emit(
+            "dispatch",
+            self.dispatch_plan.get_path(func),
+            perf_counter() - start,
+            getattr(func, "__qualname__", None),
+        )
+
+    def _run_coroutine(self, coro):
+        # asyncio.run() can't be used if a loop is already running in this thread
+        if self.persistent_loop:
+            if self._loop_runner is None:
+                self._loop_runner = LoopRunner()
+            return self._loop_runner.run(coro)
+        if is_loop_running():
+            return shared_runner.run(coro)
+        import asyncio
+
+        return asyncio.run(coro)
+
+    def close(self) -> None:
+        """ Stop the event loop used for coroutine functions, if one was started (see ``persistent_loop``) """
+        if self._loop_runner is not None:
+            self._loop_runner.close()
+
+    def call_parser_sync(self, input_args: List[str]) -> List:
+        """ Run the parser on the input arguments and execute the corresponding functions """
+        self._ensure_parser()
+
+        calls = self.get_function_calls(input_args)
+        return self._run_calls_sync(calls)
+
+    def call_many(self, invocations: Iterable[Invocation]) -> List[BatchResult]:
+        """Parse and run many invocations with the same parser
+
+        Errors do not abort the batch. Instead, the exception (e.g. an :py:class:`argtyper.exceptions.ArgParserException`
+        for invalid input, or an exception raised by one of the functions) is stored in the result of the invocation.
+
+        Args:
+            invocations: Strings, which are split into arguments like the message passed to
+                :py:meth:`__call__`, or lists of already split arguments
+
+        Returns:
+            A :py:class:`argtyper.results.BatchResult` for every invocation, in the same order
+        """
+        self._ensure_parser()
+        return list(self._iter_results(enumerate(invocations)))
+
+    def _iter_results(
+        self, invocations: Iterable[Tuple[int, Invocation]]
+    ) -> Iterator[BatchResult]:
+        for index, invocation in invocations:
+            try:
+                calls = self.get_function_calls(self.tokenizer(invocation))
+                responses = self._run_calls_sync(calls)
+            except Exception as exc:
+                yield BatchResult(invocation, error=exc, index=index)
+            else:
+                yield BatchResult(invocation, responses, index=index)
+
+    @staticmethod
+    def _read_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if line:
+                yield index, line
+
+    def serve_stream(self, lines: Iterable[str]) -> Iterator[BatchResult]:
+        """Run every line of a stream (e.g. ``sys.stdin``) as invocation and yield the results
+
+        The parser is only created once. Errors (including help and usage messages) are stored in the
+        results, instead of exiting the program.
+
+        Args:
+            lines: Any iterable of strings, e.g. a file object. Empty lines are skipped
+
+        Yields:
+            A :py:class:`argtyper.results.BatchResult` for every line, with the line number as ``index``
+        """
+        self._ensure_parser()
+        yield from self._iter_results(self._read_lines(lines))
+
+    async def serve_stream_async(
+        self, lines: Union[Iterable[str], AsyncIterable[str]]
+    ) -> AsyncIterator[BatchResult]:
+        """Like :py:meth:`serve_stream`, but the invocations are called with :py:meth:`call_parser_async`
+
+        Args:
+            lines: Any (async) iterable of strings. Empty lines are skipped
+        """
+        self._ensure_parser()
+        if hasattr(lines, "__aiter__"):
+            index = -1
+            async for line in lines:
+                index += 1
+                line = line.strip()
+                if line:
+                    yield await self._call_result_async(index, line)
+        else:
+            for index, line in self._read_lines(lines):
+                yield await self._call_result_async(index, line)
+
+    async def _call_result_async(self, index: int, line: str) -> BatchResult:
+        try:
+            responses = await self.call_parser_async(self.tokenizer(line))
+        except Exception as exc:
+            return BatchResult(line, error=exc, index=index)
+        return BatchResult(line, responses, index=index)
+
+    async def call_many_async(
+        self,
+        invocations: Iterable[Invocation],
+        concurrency: int = 100,
+        command_concurrency: Optional[Dict[Callable, int]] = None,
+    ) -> AsyncIterator[BatchResult]:
+        """Parse and run many invocations concurrently, and yield their results as soon as they are completed
+
+        The functions of a single invocation are still called one after another (command first, then its subcommands),
+        but separate invocations run concurrently. Like :py:meth:`call_many`, errors are stored in the results.
+
+        Args:
+            invocations: Strings or lists of already split arguments
+            concurrency: Maximum number of invocations running at the same time
+            command_concurrency: Mapping of functions to the maximum number of concurrent calls of the respective function
+
+        Yields:
+            A :py:class:`argtyper.results.BatchResult` for every invocation, in order of completion.
+            Use :py:attr:`argtyper.results.BatchResult.index` to match them with the invocations
+        """
+        import asyncio
+
+        self._ensure_parser()
+        limits = {
+            func: asyncio.Semaphore(limit)
+            for func, limit in (command_concurrency or {}).items()
+        }
+
+        async def run(index: int, invocation: Invocation) -> BatchResult:
+            try:
+                calls = self.get_function_calls(self.tokenizer(invocation))
+                responses = []
+                for func, kwargs in calls:
+                    limit = limits.get(func, None)
+                    if limit:
+                        async with limit:
+                            response = await self._call_async(func, kwargs)
+                    else:
+                        response = await self._call_async(func, kwargs)
+                    responses.append(response)
+            except Exception as exc:
+                return BatchResult(invocation, error=exc, index=index)
+            return BatchResult(invocation, responses, index=index)
+
+        pending: Set[asyncio.Future] = set()
+        try:
+            for index, invocation in enumerate(invocations):
+                pending.add(asyncio.ensure_future(run(index, invocation)))
+                if len(pending) < concurrency:
+                    continue
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def call_parser_async(self, input_args: List[str]) -> List:
         """ Run the parser on the input arguments and execute the corresponding functions """
-        self._prepare_parser(self.command_function)
+        self._ensure_parser()
 
         responses: List = []
         calls = self.get_function_calls(input_args)
 
         for func, kwargs in calls:
-            if inspect.iscoroutinefunction(func):
-                response = await func(**kwargs)
-            else:
-                response = await asyncio.to_thread(func, **kwargs)
+            response = await self._call_async(func, kwargs)
             responses.append(response)
         return responses
 
+    async def _call_async(self, func: Callable, kwargs: Dict[str, Any]) -> Any:
+        start = perf_counter() if hooks.observers else None
+        if is_coroutine_function(func):
+            response = await func(**kwargs)
+        else:
+            import asyncio
+
+            response = await asyncio.to_thread(func, **kwargs)
+        if start is not None:
+            self._emit_dispatch(func, start)
+        return response
+
     def _call_interactive(self, return_responses=False):
         """ Call with command line arguments """
         exit_status = 0
@@ -418,28 +976,31 @@ class ArgTyper:
             exit_status = 1
             print("Error:", exc, file=sys.stderr)
         except ArgParserExitException as exc:
-            print(exc.parser._message)
+            if exc.output or self.output is None:
+                print(exc.output)
             exit_status = exc.status
         else:
-            if getattr(self.parser, "_message", None):
-                print(self.parser._message)
+            message = self.parser.pop_output()
+            if message:
+                print(message)
 
         sys.exit(exit_status)
 
-    def _call_inline(self, message) -> List:
-        """ Call with a string """
-        input_args = shlex.split(message)
+    def _call_inline(self, message: Invocation) -> List:
+        """ Call with a string or a list of arguments """
+        input_args = self.tokenizer(message)
         return self.call_parser_sync(input_args)
 
     def __call__(
-        self, message: Optional[Text] = None, return_responses=False
+        self, message: Optional[Invocation] = None, return_responses=False
     ) -> Optional[List]:
         """Run the Argtyper, parse arguments and call functions
 
         Args:
-            message: If message is set to a string, this string will be parsed into arguments. If set to None, command line arguments will be used.
+            message: If message is set to a string, this string will be parsed into arguments. A list of
+                already split arguments is used as it is. If set to None, command line arguments will be used.
         """
 
-        if message:
+        if message or (message is not None and not isinstance(message, str)):
             return self._call_inline(message)
         return self._call_interactive(return_responses)
@@ -1,7 +1,7 @@
 import argparse
 from typing import Iterable, Optional, Tuple, cast, Any, Union
 
-from .base import remove_uuid4_prefix
+from .base import remove_dest_prefix
 
 
 class TupleAction(argparse.Action):
@@ -19,7 +19,7 @@ class TupleAction(argparse.Action):
         self.metavar_types = metavar
         # self.metavar_names = tuple([x.__name__.upper() for x in metavar])
         self.metavar_names = tuple([x.__name__.upper() for x in metavar])
-        self.name = remove_uuid4_prefix(dest)
+        self.name = remove_dest_prefix(dest)
 
         if default:
             # print("metavar", metavar)
@@ -74,11 +74,11 @@ class TypedChoiceAction(argparse.Action):
                 pass
         if option_string:
             parser.error(
-                f"argument {remove_uuid4_prefix(option_string)}: invalid choice '{values}' (choose from {list(self._choices)})"
+                f"argument {option_string}: invalid choice '{values}' (choose from {list(self._choices)})"
             )
         else:
             parser.error(
-                f"argument {remove_uuid4_prefix(self.metavar)}: invalid choice '{values}' (choose from {list(self._choices)})"
+                f"argument {self.metavar}: invalid choice '{values}' (choose from {list(self._choices)})"
             )
 
 
@@ -118,5 +118,5 @@ class BoolAction(argparse.Action):
             parser.error(f"argument {option_string}: {str(e)}")
 
         parser.error(
-            f"argument {remove_uuid4_prefix(self.dest)}: invalid choice '{values}' (choose from {no} / {yes})"
+            f"argument {remove_dest_prefix(self.dest)}: invalid choice '{values}' (choose from {no} / {yes})"
         )
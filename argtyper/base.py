@@ -1,19 +1,25 @@
 """ This file cotains mostly wrappers to convert argparse functionallity to decorators """
 
 import sys
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
 from abc import ABCMeta, abstractmethod
 from argparse import Action, ArgumentParser, FileType, HelpFormatter
 from typing import (
     Any,
     Callable,
     Dict,
+    FrozenSet,
     Iterable,
+    Iterator,
     List,
     NoReturn,
     Optional,
     Text,
     Tuple,
     Type,
+    TextIO,
     TypeVar,
     Union,
     Literal,
@@ -25,13 +31,48 @@ from .exceptions import (
     ArgTyperException,
     ArgTyperArgumentException,
 )
+from .prefix import PrefixIndex, PrefixSubParsersAction
+from .registry import Registry, ResolutionCache, get_kinds, index, unbound
+
+
+@lru_cache(maxsize=None)
+def _option_tuples_with_sep() -> bool:
+    """ Newer versions of argparse add the separator (e.g. "=") to the tuples returned by ``_get_option_tuples`` """
+    parser = ArgumentParser(prog="probe", add_help=False)
+    parser.add_argument("--probe")
+    return len(ArgumentParser._get_option_tuples(parser, "--pro")[0]) == 4
+
+
+def get_dest(path: Tuple[str, ...], name: str) -> str:
+    """Return the name of a parameter inside the parser namespace
+
+    This is unique for all commands in a command tree, since it contains the names of the subcommands leading
+    to the command (e.g. ``"sub subsub:name"``, or ``":name"`` for the main command).
+
+    Args:
+        path: The names of the subcommands leading to the command of the parameter
+        name: The name of the function parameter
+    """
+    return f"{' '.join(path)}:{name}"
+
+
+def remove_dest_prefix(dest: str) -> str:
+    """Return the parameter name of a destination created with :py:func:`get_dest`
+
+    Other strings (which don't end with ``:`` followed by a parameter name) are returned unchanged.
+    """
+    _, separator, name = dest.rpartition(":")
+    if separator and name.isidentifier():
+        return name
+    return dest
 
 
 def remove_uuid4_prefix(name):
+    """ Deprecated: Use :py:func:`remove_dest_prefix` """
     if "_" in name and name.index("_") == 32:
         return name[33:]
     else:
-        return name
+        return remove_dest_prefix(name)
 
 
 def change_metavar(kwargs, case: Literal["upper", "lower"] = "upper"):
@@ -49,46 +90,298 @@ def change_metavar(kwargs, case: Literal["upper", "lower"] = "upper"):
 
 
 class ArgTyperHelpFormatter(HelpFormatter):
-    """Help message formatter which uses the argument 'dest' but removes a uuid4 hex value prefix"""
+    """Help message formatter which uses the argument 'dest' but removes the command path prefix"""
 
     def _get_default_metavar_for_optional(self, action):
-        name = remove_uuid4_prefix(action.dest)
+        name = remove_dest_prefix(action.dest)
         return name.upper()
 
     def _get_default_metavar_for_positional(self, action):
-        name = remove_uuid4_prefix(action.dest)
+        name = remove_dest_prefix(action.dest)
         return name
 
 
+# Where parsers write messages: a stream, a callable, or `None` to collect them in a buffer per call and thread
+OutputSink = Optional[Union[TextIO, Callable[[str], Any]]]
+output_sink: ContextVar[OutputSink] = ContextVar("output_sink", default=None)
+
+
+class _OptionTable(dict):
+    """ The option strings of a parser (``_option_string_actions``), which counts how often it was changed """
+
+    __slots__ = ("version",)
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.version = 0
+
+    def __setitem__(self, key: str, value: Action) -> None:
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args: Any) -> Any:
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self) -> Tuple[str, Action]:
+        self.version += 1
+        return super().popitem()
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.version += 1
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self.version += 1
+        super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self.version += 1
+        super().clear()
+
+
+# Types of defaults which are part of the help state as they are (others are represented by their repr)
+_PLAIN_TYPES = frozenset((str, int, type(None)))
+
+
 class ArgParser(ArgumentParser):
     """An argument parser that throws exceptions instead of terminating the program
 
 
     In the future it might be possible to replace this with the "exit_on_error=False" setting to ArgumentParser (new in python 3.9)
+
+    A parser can be used by several threads at the same time. Messages (e.g. help) are written to the sink set in
+    :py:data:`output_sink` for the current context. Without a sink, they are collected separately for every thread
+    and call of :py:meth:`parse_known_args`, and are attached to the raised exceptions as ``output``.
     """
 
     def __init__(self, *args, **kwargs):
-        self._message = ""
+        self._output = threading.local()
+        self._deferred: Optional[Callable[[], None]] = None
+        self._pending = False
+        # The exception raised by the deferred callback, if it failed
+        self._deferred_error: Optional[BaseException] = None
+        self._lock = threading.RLock()
+        self._option_index = PrefixIndex(())
+        # The version of the option table the index was built for
+        self._option_index_version: Optional[int] = None
+        self._subparsers_actions: List[Action] = []
+        # "help"/"usage" -> (help state, text), see format_help
+        self._formatted: Dict[str, Tuple[Tuple, str]] = {}
         kwargs["formatter_class"] = ArgTyperHelpFormatter
         super().__init__(*args, **kwargs)
+        # The groups share the option table of the parser
+        table = _OptionTable(self._option_string_actions)
+        for container in [self, *self._action_groups, *self._mutually_exclusive_groups]:
+            container._option_string_actions = table
+
+    def defer(self, callback: Callable[[], None]) -> None:
+        """Postpone adding the arguments of this parser until it is used for the first time
+
+        Args:
+            callback: Called (once) with no arguments before this parser parses input or formats a help message
+        """
+        self._deferred = callback
+        self._pending = True
+
+    def materialize(self) -> None:
+        """Run a deferred callback set with :py:meth:`defer`, if there is one
+
+        Other threads using the parser wait until the callback is finished.
+
+        Raises:
+            ArgTyperException: If the callback failed before. The parser is incomplete then, so every later call
+                fails as well (the original exception is attached as ``__cause__``)
+        """
+        if not self._pending:
+            return
+        with self._lock:
+            if self._deferred_error is not None:
+                raise ArgTyperException(
+                    f"Creating the parser '{self.prog}' failed before"
+                ) from self._deferred_error
+            # Cleared before the callback runs, since the callback may use the parser itself
+            deferred, self._deferred = self._deferred, None
+            if deferred:
+                try:
+                    deferred()
+                except BaseException as exc:
+                    self._deferred_error = exc
+                    raise
+                self._pending = False
+
+    @property
+    def _message(self) -> str:
+        """ The messages collected by the parser during the current call in this thread """
+        return "".join(getattr(self._output, "parts", ()))
+
+    @_message.setter
+    def _message(self, message: str) -> None:
+        self._output.parts = [message] if message else []
+
+    def pop_output(self) -> str:
+        """ Return the messages collected during the current call in this thread, and release them """
+        message = self._message
+        self._output.parts = []
+        return message
+
+    def parse_known_args(self, args=None, namespace=None):
+        self.materialize()
+        self._message = ""
+        return super().parse_known_args(args, namespace)
+
+    def add_subparsers(self, **kwargs):
+        action = super().add_subparsers(**kwargs)
+        self._subparsers_actions.append(action)
+        return action
+
+    def format_usage(self) -> str:
+        self.materialize()
+        return self._get_formatted("usage", super().format_usage)
+
+    def format_help(self) -> str:
+        """Return the help message
+
+        The message is only rendered the first time, and again after anything it shows changed (see
+        :py:meth:`help_state`).
+        """
+        self.materialize()
+        return self._get_formatted("help", super().format_help)
+
+    def help_state(self) -> Tuple:
+        """ Everything the help and usage message depend on, which might change after the parser was built """
+        import shutil
+
+        # Only strings, numbers and tuples, so the state can be stored in the spec cache
+        actions = self._actions
+        return (
+            self.prog,
+            self.usage,
+            self.description,
+            self.epilog,
+            len(actions),
+            tuple([action.help for action in actions]),
+            tuple(
+                [
+                    action.default if type(action.default) in _PLAIN_TYPES else repr(action.default)
+                    for action in actions
+                ]
+            ),
+            tuple(
+                tuple([choice.help for choice in action._choices_actions])  # type: ignore
+                for action in self._subparsers_actions
+            ),
+            shutil.get_terminal_size().columns,
+        )
+
+    def _get_formatted(self, kind: str, render: Callable[[], str]) -> str:
+        state = self.help_state()
+        formatted = self._formatted.get(kind, None)
+        if formatted is not None and formatted[0] == state:
+            return formatted[1]
+        text = render()
+        self._formatted[kind] = (state, text)
+        return text
+
+    def get_formatted(self) -> Dict[str, Tuple[Tuple, str]]:
+        """ The help and usage messages rendered so far, as mapping of ``"help"``/``"usage"`` to (state, text) """
+        return dict(self._formatted)
+
+    def preload_formatted(self, formatted: Dict[str, Tuple[Tuple, str]]) -> None:
+        """Set previously rendered help and usage messages (see :py:meth:`get_formatted`)
+
+        They are only used if the :py:meth:`help_state` of this parser matches theirs when the message is needed.
+        """
+        self._formatted.update(formatted)
+
+    def get_option_index(self) -> PrefixIndex:
+        """ The index of all option strings of this parser, used to resolve abbreviated options """
+        # Rebuilt whenever option strings were added, removed or replaced (e.g. by resolving conflicts)
+        table = self._option_string_actions
+        version = getattr(table, "version", None)
+        if version is None or version != self._option_index_version:
+            self._option_index = PrefixIndex(table)
+            self._option_index_version = version
+        return self._option_index
+
+    def _get_option_tuples(self, option_string: str) -> List[Tuple]:
+        # Same result as ArgumentParser._get_option_tuples, which scans all option strings for every call
+        chars = self.prefix_chars
+        if option_string[0] not in chars:
+            return super()._get_option_tuples(option_string)
+        actions = self._option_string_actions
+        with_sep = _option_tuples_with_sep()
+        result = []
+
+        if option_string[1] in chars:
+            if not self.allow_abbrev:
+                return result
+            option_prefix, sep, explicit_arg = option_string.partition("=")
+            if not sep:
+                sep = explicit_arg = None
+            for match in self.get_option_index().match(option_prefix):
+                if match not in actions:
+                    continue
+                if with_sep:
+                    result.append((actions[match], match, sep, explicit_arg))
+                else:
+                    result.append((actions[match], match, explicit_arg))
+            return result
+
+        index = self.get_option_index()
+        short_option_prefix = option_string[:2]
+        short_explicit_arg = option_string[2:]
+        matches = index.match(option_string)
+        if short_option_prefix in actions and short_option_prefix not in matches:
+            matches.append(short_option_prefix)
+            matches.sort(key=lambda match: index.order.get(match, -1))
+        for match in matches:
+            if match not in actions:
+                continue
+            if match == short_option_prefix:
+                if with_sep:
+                    result.append((actions[match], match, "", short_explicit_arg))
+                else:
+                    result.append((actions[match], match, short_explicit_arg))
+            elif with_sep:
+                result.append((actions[match], match, None, None))
+            else:
+                result.append((actions[match], match, None))
+        return result
 
     def _print_message(self, message: str, file=None) -> None:
-        if message:
-            self._message += message  # type: ignore
+        if not message:
+            return
+        sink = output_sink.get()
+        if sink is None:
+            parts = getattr(self._output, "parts", None)
+            if parts is None:
+                parts = self._output.parts = []
+            parts.append(message)
+        elif hasattr(sink, "write"):
+            sink.write(message)  # type: ignore
+        else:
+            sink(message)  # type: ignore
 
     def error(self, message: Text) -> NoReturn:
         exc = sys.exc_info()[1]
         if exc:
-            raise ArgParserException(self, message) from exc
-        raise ArgParserException(self, message)
+            raise ArgParserException(self, message, self.pop_output()) from exc
+        raise ArgParserException(self, message, self.pop_output())
 
     def exit(self, status=0, message: Text = None) -> NoReturn:
         if message:
             self._print_message(message)
         exc = sys.exc_info()[1]
         if exc:
-            raise ArgParserExitException(self, status, message) from exc
-        raise ArgParserExitException(self, status, message)
+            raise ArgParserExitException(
+                self, status, message, self.pop_output()
+            ) from exc
+        raise ArgParserExitException(self, status, message, self.pop_output())
 
 
 class DEFAULT(object):
@@ -110,34 +403,27 @@ class ArgTyperAttribute(object, metaclass=ABCMeta):
             self.arg_options: Dict = dict()
         super().__init__()
 
-    _registered_functions: Dict = {}
+    _registered_functions: Registry = Registry()
 
     @staticmethod
     def _get_unbound_function(func):
-        isbound = getattr(func, "__self__", None)
-        if isbound:
-            func = func.__func__
-        return func
+        return unbound(func)
+
+    # Which registered function a callable resolves to, for the registries of all subclasses
+    _resolution_cache = ResolutionCache()
 
     @classmethod
     def _get_attr_for_func(cls, func: Callable):
         """Iterate through functions and parents until we either find the attribute, or can't go further
 
         This only works if @wraps is used on function wrappers. Conversely, this can be interrupted if a function is wrapped without @wraps.
+        The result is cached until the next attribute is registered.
         """
-        while True:
-            attribute = cls._registered_functions.get(func, None)
-            if attribute:
-                return attribute
-            isbound = getattr(func, "__self__", None)
-            if isbound:
-                func = func.__func__  # type: ignore
-                continue
-            wrapped = getattr(func, "__wrapped__", None)
-            if wrapped:
-                func = wrapped
-                continue
+        registry = cls._registered_functions
+        resolved = ArgTyperAttribute._resolution_cache.resolve(func, registry)
+        if resolved is None:
             return None
+        return registry.get(resolved, None)
 
     @classmethod
     def get(cls, func: Callable, raise_exc: bool = False, default: Any = None):
@@ -150,8 +436,7 @@ class ArgTyperAttribute(object, metaclass=ABCMeta):
             raise_exc: If set to `True`, this will raise an exception, if the function does not have this attribute set
             default: The default value to return, in case we don't find the element and do not raise an exception
         """
-        if getattr(func, "__self__", None):
-            func = func.__func__  # type: ignore
+        func = unbound(func)
         existing = cls._get_attr_for_func(func)
         if existing:
             return existing
@@ -178,6 +463,24 @@ class ArgTyperAttribute(object, metaclass=ABCMeta):
             cls._registered_functions[func] = default
         return cls._registered_functions[func]
 
+    @classmethod
+    def get_all(cls, func: Callable) -> Dict[Type["ArgTyperAttribute"], Any]:
+        """Get all ArgTyper attributes of a function at once
+
+        Args:
+            func: The callable for which we want to retrieve the ArgTyper attributes
+
+        Returns:
+            A mapping of the attribute classes (e.g. :py:class:`Argument`) to the attributes set for ``func``.
+            Classes of attributes that are not set are left out
+        """
+        attributes = {}
+        for attribute_class in get_kinds(func):
+            attribute = attribute_class.get(func)
+            if attribute:
+                attributes[attribute_class] = attribute
+        return attributes
+
     @classmethod
     def _get_all_subclasses(cls):
         return set(cls.__subclasses__()).union(
@@ -187,11 +490,23 @@ class ArgTyperAttribute(object, metaclass=ABCMeta):
     @classmethod
     def has_attribute(cls, func: Callable) -> bool:
         """ Check if a Callable has any ArgTyper attribute set """
-        subs = cls._get_all_subclasses()
-        for c in subs:
-            if c.get(func):
-                return True
-        return False
+        return ArgTyperAttribute._resolution_cache.resolve(func, index) is not None
+
+    @classmethod
+    def get_kinds(cls, func: Callable) -> FrozenSet[Type["ArgTyperAttribute"]]:
+        """ Return the classes of all ArgTyper attributes set for a Callable (e.g. ``{Command, Argument}``) """
+        return get_kinds(func)
+
+    @classmethod
+    def iter_registered(cls) -> Iterator[Callable]:
+        """Iterate over all functions which have this attribute set
+
+        Called on :py:class:`ArgTyperAttribute` itself, this iterates over all functions with any ArgTyper
+        attribute. For methods, the underlying function is returned.
+        """
+        if cls is ArgTyperAttribute:
+            return iter(index)
+        return iter(cls._registered_functions)
 
     @abstractmethod
     def __call__(self, func: Callable):
@@ -223,9 +538,12 @@ class Argument(ArgTyperAttribute):
     Args:
         reference: The name of the function parameter that we want to change the options for
         name_or_flags: The alternate names or flags we want to use for this parameter
+        completer: Marks the parameter as dynamic for the completion scripts of :py:mod:`argtyper.completion`.
+            Called with the beginning of the value to complete, it returns the possible values.
+            This is not passed to ``add_argument``
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(
         self,
@@ -244,10 +562,12 @@ class Argument(ArgTyperAttribute):
         metavar: Optional[Union[Text, Tuple[Text, ...], DEFAULT]] = Default,
         dest: Optional[Union[Text, DEFAULT]] = Default,
         version: Union[Text, DEFAULT] = Default,
+        completer: Optional[Callable[[str], Iterable[str]]] = None,
         **kwargs: Any,
     ):
 
         self.reference = reference
+        self.completer = completer
         self.arg_names = name_or_flags
         self.arg_options: Dict[str, Any] = dict()
         self.arg_options["action"] = action
@@ -293,9 +613,13 @@ class Command(ArgTyperAttribute):
         hardcoded_types: Mapping of `<types>:values` to be used as argument for parameters with those types.
             This will always overwrite parameters with this type and ignore things set in arg_defaults.
         arg_defaults: Mapping of Parameter names to default values. This will be passed to `argparse.ArgumentParser.set_defaults`
+        cache_results: If set to `False`, invocations of this command are never stored in the result cache of an ArgTyper
+            (see ``result_cache`` of :py:class:`argtyper.ArgTyper`)
+        uncached_args: List of parameter names, whose values have to be created anew for every invocation.
+            Invocations which call this command with any of these parameters are never stored in the result cache
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(
         self,
@@ -305,6 +629,8 @@ class Command(ArgTyperAttribute):
         hardcoded_names: Dict[str, Any] = None,
         hardcoded_types: Dict[Any, Any] = None,
         arg_defaults: Dict[str, Any] = None,
+        cache_results: bool = True,
+        uncached_args: List[str] = None,
         prog=Default,
         usage=Default,
         description=Default,
@@ -347,8 +673,8 @@ class Command(ArgTyperAttribute):
         self.arg_defaults = arg_defaults or {}
         self.hardcoded_names = hardcoded_names or {}
         self.hardcoded_types = hardcoded_types or {}
-        self.handled_args: List[str] = []
-        self.hardcoded_args: Dict[str, Any] = {}
+        self.cache_results = cache_results
+        self.uncached_args = uncached_args or []
 
     def get_argparser(self):
         options = self.get_set_options(ignore=["help"])
@@ -378,7 +704,7 @@ class SubParser(ArgTyperAttribute):
     This information is passed to ``ArgumentParser.add_subparsers``
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(
         self,
@@ -415,8 +741,19 @@ class SubParser(ArgTyperAttribute):
         self.get_or_create(func, default=self)
         return func
 
-    def add_subparser_to_parser(self, parser: ArgumentParser) -> Action:
-        subparsers = parser.add_subparsers(**self.get_set_options())
+    def add_subparser_to_parser(
+        self, parser: ArgumentParser, prefixes: bool = False
+    ) -> Action:
+        """Add the subparsers action to ``parser``
+
+        Args:
+            parser: The parser of the command
+            prefixes: Select subcommands by unique prefixes, unless another ``action`` was set
+        """
+        options = self.get_set_options()
+        if prefixes:
+            options.setdefault("action", PrefixSubParsersAction)
+        subparsers = parser.add_subparsers(**options)
         return subparsers
 
 
@@ -439,7 +776,7 @@ class SubCommand(ArgTyperAttribute):
         name: Optionally, a name to be used for this subcommand
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(self, subfunction: Union[Callable, Text], name: Optional[Text] = None):
         self.subfunction: Optional[Callable] = None
@@ -460,15 +797,18 @@ class SubCommand(ArgTyperAttribute):
         if self.subfunction:
             return self.subfunction
 
-        namespaces = [namespace]
-        namespaces.append(getattr(namespace, "__self__", {}))
-        namespaces.append(namespace.__globals__)
-        namespaces.append(globals())
+        subfunction = getattr(namespace, self.subfunction_name, None)
+        if not subfunction:
+            # Methods are bound to the instance of this call, so they are not remembered
+            instance = getattr(namespace, "__self__", None)
+            method = getattr(instance, self.subfunction_name, None)
+            if method:
+                return method
 
+        namespaces = [namespace.__globals__, globals()]
         for entry in namespaces:
-            self.subfunction = self.subfunction or getattr(
-                entry, self.subfunction_name, None
-            )
+            subfunction = subfunction or getattr(entry, self.subfunction_name, None)
+        self.subfunction = subfunction
 
         if not self.subfunction:
             self.subfunction
@@ -480,6 +820,18 @@ class SubCommand(ArgTyperAttribute):
         return self.subfunction
 
 
+def _get_parser_groups(parser: ArgumentParser) -> Dict:
+    """The argument groups added to a parser, by the decorator they were created for
+
+    The groups are stored on the parser rather than on the decorator, so a decorator can be used for many parsers
+    and does not keep any of them alive.
+    """
+    groups = getattr(parser, "_argtyper_groups", None)
+    if groups is None:
+        groups = parser._argtyper_groups = {}  # type: ignore
+    return groups
+
+
 class MutuallyExclusiveArgumentGroup(ArgTyperAttribute):
     """Add an argument group to this function
 
@@ -490,17 +842,18 @@ class MutuallyExclusiveArgumentGroup(ArgTyperAttribute):
         required: Indicate if at least one of the arguments is required to be set or not (default: False)
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(self, arguments: List[str], required=False):
         self.arguments = arguments
         self.required = required
-        self.group = None
 
     def get_group(self, parser: ArgParser):
-        if not self.group:
-            self.group = parser.add_mutually_exclusive_group(required=self.required)
-        return self.group
+        """ Return the group for ``parser``, which is created the first time it is requested """
+        groups = _get_parser_groups(parser)
+        if self not in groups:
+            groups[self] = parser.add_mutually_exclusive_group(required=self.required)
+        return groups[self]
 
     def __call__(self, func: Callable) -> Callable:
         options = self._registered_functions.setdefault(func, [])
@@ -518,18 +871,19 @@ class ArgumentGroup(ArgTyperAttribute):
         description: Optionally, a description for this group
     """
 
-    _registered_functions: Dict = dict()
+    _registered_functions: Registry = Registry()
 
     def __init__(self, arguments: List[str], title: str = None, description=None):
         self.arguments = arguments
         self.title = title
         self.description = description
-        self.group = None
 
     def get_group(self, parser: ArgParser):
-        if not self.group:
-            self.group = parser.add_argument_group(self.title, self.description)
-        return self.group
+        """ Return the group for ``parser``, which is created the first time it is requested """
+        groups = _get_parser_groups(parser)
+        if self not in groups:
+            groups[self] = parser.add_argument_group(self.title, self.description)
+        return groups[self]
 
     def __call__(self, func: Callable) -> Callable:
         options = self._registered_functions.setdefault(func, [])
@@ -0,0 +1,228 @@
+""" Run the invocations of a JSONL file with a pool of processes
+
+Usage: ``python -m argtyper.batch module:function invocations.jsonl``
+
+Every line of the input file contains the arguments of one invocation, either as list of strings or as
+a single string (which is split like the message passed to an ArgTyper instance). All invocations are parsed
+in the main process, while the functions are called in a :py:class:`concurrent.futures.ProcessPoolExecutor`.
+All functions of one invocation (the command and its subcommands) are called in order inside the same worker.
+
+The results are written as JSONL. Each line contains the ``index`` of the invocation, and either its
+``responses`` or an ``error``. Lines which are not valid JSON, or neither a string nor a list of strings, result in
+an ``error`` as well.
+Results are written while the input is still read, and only a limited number of invocations is submitted to the
+pool at any time, so the input can be a stream of any length.
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import ArgTyper
+from .base import Argument, Command
+from .spec import resolve_ref
+from .tokenizer import split
+
+
+def run_calls(calls: List[Tuple[Callable, Dict[str, Any]]]) -> List:
+    """ Call the functions of a single invocation in order and return their responses """
+    responses = []
+    for func, kwargs in calls:
+        if inspect.iscoroutinefunction(func):
+            response = asyncio.run(func(**kwargs))
+        else:
+            response = func(**kwargs)
+        responses.append(response)
+    return responses
+
+
+def load_argtyper(target: str) -> ArgTyper:
+    """ Import ``module:function`` and return an ArgTyper for it. ArgTyper instances are returned as they are """
+    obj = resolve_ref(target)
+    if isinstance(obj, ArgTyper):
+        return obj
+    return ArgTyper(obj)
+
+
+def _error(index: int, exc: BaseException) -> Dict:
+    return {
+        "index": index,
+        "error": {"type": type(exc).__name__, "message": str(exc)},
+    }
+
+
+def _read_invocations(lines: IO[str]) -> Iterator[Union[List[str], Exception]]:
+    """ Yield the argument list of every line, or the exception raised while reading it """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            invocation = json.loads(line)
+            if isinstance(invocation, str):
+                invocation = split(invocation)
+            elif not isinstance(invocation, list) or not all(
+                isinstance(arg, str) for arg in invocation
+            ):
+                raise ValueError(
+                    f"An invocation must be a string or a list of strings, not {line.strip()!r}"
+                )
+        except ValueError as exc:
+            yield exc
+            continue
+        yield invocation
+
+
+def run_batch(
+    at: ArgTyper,
+    lines: IO[str],
+    output: IO[str],
+    workers: Optional[int] = None,
+    order: Literal["input", "completion"] = "input",
+    max_pending: Optional[int] = None,
+) -> int:
+    """Parse the invocations read from ``lines`` and run them with a pool of processes
+
+    Results are written as soon as they are available, while the input is still read.
+
+    Args:
+        at: The ArgTyper used to parse the invocations
+        lines: JSONL input, one invocation per line
+        output: Stream the JSONL results are written to
+        workers: Number of worker processes (default: number of CPUs)
+        order: Write results in the order of the ``input``, or as soon as an invocation is completed
+        max_pending: The maximum number of invocations submitted to the pool, whose results have not been written
+            yet (default: four times the number of workers). Reading the input waits, until results are written
+
+    Returns:
+        The number of failed invocations
+    """
+    at.get_parser()
+    workers = workers or os.cpu_count() or 1
+    failed = 0
+    lock = threading.Lock()
+    # Released whenever a result is written, so at most max_pending invocations are waiting
+    slots = threading.BoundedSemaphore(max(1, max_pending or 4 * workers))
+    # order="input": the results, which have not been written yet, in input order
+    queue: Deque[Tuple[int, Union[Dict, Future]]] = deque()
+
+    def write(result: Dict) -> None:
+        nonlocal failed
+        try:
+            if "error" in result:
+                failed += 1
+            output.write(json.dumps(result, default=repr) + "\n")
+            output.flush()
+        finally:
+            slots.release()
+
+    def result_of(index: int, future: Future) -> Dict:
+        try:
+            return {"index": index, "responses": future.result()}
+        except Exception as exc:
+            return _error(index, exc)
+
+    def flush() -> None:
+        """ Write the results at the start of the queue, which are available. Called with the lock held """
+        while queue:
+            index, result = queue[0]
+            if isinstance(result, Future):
+                if not result.done():
+                    return
+                result = result_of(index, result)
+            queue.popleft()
+            write(result)
+
+    def completed(index: int, future: Future) -> None:
+        with lock:
+            if order == "completion":
+                write(result_of(index, future))
+            else:
+                flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, invocation in enumerate(_read_invocations(lines)):
+            slots.acquire()
+            result: Union[Dict, Future]
+            try:
+                if isinstance(invocation, Exception):
+                    raise invocation
+                calls = at.get_function_calls(invocation)
+            except Exception as exc:
+                result = _error(index, exc)
+            else:
+                result = executor.submit(run_calls, calls)
+
+            if isinstance(result, Future):
+                if order == "input":
+                    with lock:
+                        queue.append((index, result))
+                # Called right away (in this thread), if the future is already done
+                result.add_done_callback(partial(completed, index))
+                continue
+            with lock:
+                if order == "input":
+                    queue.append((index, result))
+                    flush()
+                else:
+                    write(result)
+    return failed
+
+
+@Command(
+    prog="python -m argtyper.batch",
+    description="Run the invocations of a JSONL file with a pool of processes",
+)
+@Argument("target", help="The command to run as 'module:function'")
+@Argument(
+    "invocations", help="JSONL file with one argument list per line ('-' for stdin)"
+)
+@Argument("output", "--output", "-o", help="File for the JSONL results")
+@Argument("workers", "--workers", "-w", help="Number of worker processes")
+@Argument("order", help="Order in which results are written")
+@Argument(
+    "max_pending",
+    "--max-pending",
+    help="Maximum number of submitted invocations without written results (default: 4 * workers)",
+)
+def main(
+    target: str,
+    invocations: str,
+    output: str = "-",
+    workers: int = None,
+    order: Literal["input", "completion"] = "input",
+    max_pending: int = None,
+) -> int:
+    at = load_argtyper(target)
+    in_file = sys.stdin if invocations == "-" else open(invocations, "r")
+    out_file = sys.stdout if output == "-" else open(output, "w")
+    try:
+        return run_batch(at, in_file, out_file, workers, order, max_pending)
+    finally:
+        if in_file is not sys.stdin:
+            in_file.close()
+        if out_file is not sys.stdout:
+            out_file.close()
+
+
+if __name__ == "__main__":
+    responses = ArgTyper(main)(return_responses=True)
+    sys.exit(1 if responses and responses[0] else 0)
@@ -0,0 +1,230 @@
+""" Caches to reuse parsers created by ArgTyper and the results of parsing """
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from .base import ArgParser
+    from .dispatch import DispatchPlan
+
+
+def freeze(value: Any) -> Hashable:
+    """Convert a (possibly nested) configuration value into something that can be used as a dictionary key
+
+    Values that can not be hashed are represented by their type and ``repr()``.
+    """
+    if isinstance(value, dict):
+        return tuple(
+            sorted(((freeze(k), freeze(v)) for k, v in value.items()), key=repr)
+        )
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((freeze(v) for v in value), key=repr))
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    return (type(value), value)
+
+
+# Values of these types are never changed in place, so they don't have to be copied
+_IMMUTABLE = frozenset((str, bytes, int, float, complex, bool, type(None)))
+
+
+def _is_immutable(value: Any) -> bool:
+    value_type = type(value)
+    if value_type in _IMMUTABLE:
+        return True
+    if value_type is tuple or value_type is frozenset:
+        return all(_is_immutable(v) for v in value)
+    return False
+
+
+def _copy_kwargs(kwargs: Dict[str, Any], shared: Collection[str]) -> Dict[str, Any]:
+    return {
+        name: value
+        if name in shared or _is_immutable(value)
+        else copy.deepcopy(value)
+        for name, value in kwargs.items()
+    }
+
+
+class BuiltParser:
+    """The parser created for a function together with the plan to map its results to function calls
+
+    Args:
+        parser: The (root) parser
+        dispatch_plan: The plan used to map the parser namespace to function calls
+    """
+
+    def __init__(self, parser: "ArgParser", dispatch_plan: "DispatchPlan"):
+        self.parser = parser
+        self.dispatch_plan = dispatch_plan
+
+
+class ParserCache:
+    """A bounded cache of parsers, shared by all ArgTyper instances of this process
+
+    Entries are keyed by the function and the configuration of the ArgTyper instance. If the cache is full,
+    the least recently used entry is dropped. The cache can be used from several threads.
+
+    The cache keeps its functions (and, for bound methods, their instances) alive until their entries are dropped,
+    so at most ``maxsize`` of them. Use :py:meth:`invalidate` to release them earlier.
+    Nothing is stored on the functions or instances themselves.
+
+    Args:
+        maxsize: The maximum number of parsers to keep
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Callable, Hashable], BuiltParser]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, func: Callable, config: Hashable) -> Optional[BuiltParser]:
+        """ Return the cached parser for a function and configuration, or `None` """
+        key = (func, config)
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, func: Callable, config: Hashable, entry: BuiltParser) -> None:
+        """ Add a parser to the cache """
+        with self._lock:
+            self._entries[(func, config)] = entry
+            self._entries.move_to_end((func, config))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, func: Optional[Callable] = None) -> None:
+        """Remove cached parsers
+
+        Args:
+            func: Only remove the parsers created for this function (or methods bound to it).
+                If set to `None` (default), the whole cache is cleared
+        """
+        with self._lock:
+            if func is None:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                cached_func = key[0]
+                if cached_func == func or getattr(cached_func, "__func__", None) == func:
+                    del self._entries[key]
+
+
+parser_cache = ParserCache()
+
+
+class ResultCache:
+    """A bounded cache of the function calls returned for argument lists
+
+    Used by :py:class:`argtyper.ArgTyper` (see ``result_cache``) to skip the parser for repeated input.
+    Argument values, which could be changed in place (e.g. lists), are deep-copied when they are stored and for every
+    call, so a function changing its arguments does not change the arguments of later calls. Calls with values which
+    can not be copied (e.g. objects holding a lock or a socket) are not cached.
+    If the cache is full, the least recently used entry is dropped. The cache can be used from several threads.
+
+    Args:
+        maxsize: The maximum number of argument lists to keep
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # argument list -> ((function, kwargs, names of the shared kwargs), ...)
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[Tuple[Callable, Dict[str, Any], Collection[str]], ...]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, input_args: Sequence[str]
+    ) -> Optional[List[Tuple[Callable, Dict[str, Any]]]]:
+        """ Return the function calls for an argument list, or `None` """
+        key = tuple(input_args)
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+        try:
+            calls = [(func, _copy_kwargs(kwargs, shared)) for func, kwargs, shared in entry]
+        except Exception:
+            # Copying the stored values failed, so the entry can't be used. The input is parsed again instead
+            with self._lock:
+                if self._entries.get(key, None) is entry:
+                    del self._entries[key]
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return calls
+
+    def put(
+        self,
+        input_args: Sequence[str],
+        calls: List[Tuple[Callable, Dict[str, Any]]],
+        shared: Sequence[Collection[str]] = (),
+    ) -> None:
+        """Add the function calls for an argument list to the cache
+
+        Nothing is added if the keyword arguments can not be copied.
+
+        Args:
+            input_args: The argument list
+            calls: The function calls returned by the parser
+            shared: For every call, the names of the keyword arguments which are passed as they are
+                instead of being copied (e.g. values hardcoded by :py:class:`argtyper.Command`)
+        """
+        key = tuple(input_args)
+        try:
+            entry = tuple(
+                (func, _copy_kwargs(kwargs, names), frozenset(names))
+                for (func, kwargs), names in zip(calls, shared or [()] * len(calls))
+            )
+        except Exception:
+            # The values can't be copied (e.g. locks or sockets), so they can't be reused safely
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """ Remove all entries """
+        with self._lock:
+            self._entries.clear()
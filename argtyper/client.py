@@ -0,0 +1,85 @@
+""" Minimal client for :py:mod:`argtyper.server`
+
+This file only uses the standard library and does not import argtyper, so it starts as fast as possible.
+Run it as script (not with ``-m``, which would import the argtyper package):
+
+    python -S path/to/argtyper/client.py SOCKET [ARGS ...]
+
+The socket can also be set with the environment variable ``ARGTYPER_SOCKET``, in which case all arguments are
+passed to the command. :py:func:`argtyper.server.write_client` creates an executable launcher with a fixed socket.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+
+HEADER = struct.Struct(">cI")
+
+FRAME_REQUEST = b"r"
+FRAME_STDOUT = b"o"
+FRAME_STDERR = b"e"
+FRAME_EXIT = b"x"
+
+
+def send_frame(sock, kind, payload):
+    sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by server")
+        data += chunk
+    return data
+
+
+def recv_frame(sock):
+    kind, size = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return kind, recv_exactly(sock, size)
+
+
+def run(socket_path, argv, prog=None):
+    """ Run a command on the server and forward its output. Returns the exit status of the command """
+    request = {
+        "argv": list(argv),
+        "prog": prog or os.path.basename(sys.argv[0]),
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        send_frame(sock, FRAME_REQUEST, json.dumps(request).encode("utf-8"))
+        while True:
+            kind, payload = recv_frame(sock)
+            if kind == FRAME_STDOUT:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif kind == FRAME_STDERR:
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif kind == FRAME_EXIT:
+                return json.loads(payload)
+
+
+def main():
+    argv = sys.argv[1:]
+    socket_path = os.environ.get("ARGTYPER_SOCKET")
+    if not socket_path:
+        if not argv:
+            sys.stderr.write("usage: client.py SOCKET [ARGS ...]\n")
+            return 2
+        socket_path, argv = argv[0], argv[1:]
+    try:
+        return run(socket_path, argv)
+    except BrokenPipeError:
+        # The reader of our output went away (e.g. `| head`). Silence the error on interpreter shutdown
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
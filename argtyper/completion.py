@@ -0,0 +1,541 @@
+""" Generate static completion scripts for bash, zsh and fish
+
+Usage: ``python -m argtyper.completion script module:function --shell bash``
+
+The scripts contain the subcommands, options and choices (of ``Literal`` and ``bool`` parameters) of the whole
+command tree, so completing a command line does not start Python. Only parameters with a ``completer``
+(see :py:class:`argtyper.Argument`) call back into Python, with
+``python -m argtyper.completion complete module:function PATH PARAMETER PREFIX``. The callback only imports
+the command and looks up the completer, without creating the parser.
+
+Options are completed if the current word starts with ``-`` (other ``prefix_chars`` are not supported).
+Values in the form ``--option=value`` are not completed. Everything else falls back to file names.
+"""
+
+import argparse
+import re
+import shlex
+import sys
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Union
+
+from . import ArgTyper
+from .actions import BoolAction
+from .base import (
+    ArgParser,
+    ArgTyperAttribute,
+    Argument,
+    Command,
+    SubCommand,
+    remove_dest_prefix,
+)
+from .exceptions import ArgTyperException
+from .spec import object_ref, resolve_ref
+
+Shell = Literal["bash", "zsh", "fish"]
+
+# Options and positional arguments taking any number of values
+VARIADIC = -1
+
+# Choices are not listed in the scripts, if there are more of them
+MAX_CHOICES = 1000
+
+
+class ValueSpec:
+    """What can be completed as value of an option or positional argument
+
+    Args:
+        nargs: The number of values, or :py:data:`VARIADIC`
+        choices: The possible values, or `None` if they are not known
+        dynamic: The name of the parameter, if its values are completed by a ``completer``
+    """
+
+    def __init__(
+        self, nargs: int, choices: Optional[List[str]] = None, dynamic: Optional[str] = None
+    ):
+        self.nargs = nargs
+        self.choices = choices
+        self.dynamic = dynamic
+
+
+class CompletionNode:
+    """The options, positional arguments and subcommands of a command
+
+    Args:
+        path: The names of the subcommands leading to the command
+    """
+
+    def __init__(self, path: Tuple[str, ...] = ()):
+        self.path = path
+        self.options: Dict[str, ValueSpec] = {}
+        # One entry per value, the last one may be VARIADIC
+        self.positionals: List[ValueSpec] = []
+        self.subcommands: Dict[str, "CompletionNode"] = {}
+
+    @property
+    def key(self) -> str:
+        """ The path as used in the scripts, e.g. ``"/"`` for the main command and ``"/sub/subsub/"`` """
+        return "/" + "".join(f"{name}/" for name in self.path)
+
+    def walk(self) -> Iterator["CompletionNode"]:
+        yield self
+        for node in self.subcommands.values():
+            yield from node.walk()
+
+    def has_dynamic(self) -> bool:
+        return any(
+            value.dynamic
+            for node in self.walk()
+            for value in list(node.options.values()) + node.positionals
+        )
+
+
+def _get_completers(func: Callable) -> Dict[str, Callable]:
+    arguments = ArgTyperAttribute.get_all(func).get(Argument, {})
+    return {
+        name: argument.completer
+        for name, argument in arguments.items()
+        if argument.completer
+    }
+
+
+def _get_nargs(action: argparse.Action) -> int:
+    if action.nargs is None or action.nargs == argparse.OPTIONAL:
+        return 1
+    if isinstance(action.nargs, int):
+        return action.nargs
+    return VARIADIC
+
+
+def _get_choices(action: argparse.Action) -> Optional[List[str]]:
+    if isinstance(action, BoolAction):
+        return ["true", "false"]
+    # TypedChoiceAction keeps the choices to itself
+    choices = getattr(action, "_choices", None) or action.choices
+    if choices is None:
+        return None
+    try:
+        if len(choices) > MAX_CHOICES:
+            return None
+    except TypeError:
+        return None
+    # The scripts separate the choices by whitespace
+    return [str(choice) for choice in choices if not re.search(r"\s", str(choice))]
+
+
+def _build_node(func: Callable, parser: argparse.ArgumentParser, node: CompletionNode) -> None:
+    if isinstance(parser, ArgParser):
+        parser.materialize()
+    completers = _get_completers(func)
+    subparsers: Dict[str, argparse.ArgumentParser] = {}
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            subparsers.update(action._name_parser_map)
+            continue
+        if action.help == argparse.SUPPRESS:
+            continue
+        name = remove_dest_prefix(action.dest)
+        nargs = _get_nargs(action)
+        value = ValueSpec(
+            nargs,
+            _get_choices(action) if nargs else None,
+            name if nargs and name in completers else None,
+        )
+        if action.option_strings:
+            for flag in action.option_strings:
+                node.options[flag] = value
+        elif node.positionals and node.positionals[-1].nargs == VARIADIC:
+            # Positional arguments after a variadic one can't be told apart
+            continue
+        elif nargs == VARIADIC:
+            node.positionals.append(value)
+        else:
+            node.positionals.extend([ValueSpec(1, value.choices, value.dynamic)] * nargs)
+
+    for subcommand in SubCommand.get(func, default=[]):
+        subparser = subparsers.get(subcommand.name)
+        if subparser is None:
+            continue
+        child = CompletionNode(node.path + (subcommand.name,))
+        node.subcommands[subcommand.name] = child
+        _build_node(subcommand.get_subfunction(func), subparser, child)
+
+
+def build_tree(at: ArgTyper) -> CompletionNode:
+    """Collect everything, which can be completed, for the command tree of an ArgTyper
+
+    Lazily created subcommands (``lazy_subcommands``) are created as well.
+    """
+    root = CompletionNode()
+    _build_node(at.command_function, at.get_parser(), root)
+    return root
+
+
+def _tables(root: CompletionNode) -> Dict[str, Dict[str, str]]:
+    """ The tables used by the scripts, all keyed by the path of the command (and the option or ``#<position>``) """
+    tables: Dict[str, Dict[str, str]] = {
+        name: {} for name in ("subs", "opts", "nargs", "choices", "dynamic", "npos", "vpos")
+    }
+
+    def add_value(key: str, value: ValueSpec) -> None:
+        if value.choices is not None:
+            tables["choices"][key] = " ".join(value.choices)
+        if value.dynamic:
+            tables["dynamic"][key] = value.dynamic
+
+    for node in root.walk():
+        path = node.key
+        tables["subs"][path] = " ".join(node.subcommands)
+        tables["opts"][path] = " ".join(node.options)
+        for flag, value in node.options.items():
+            if value.nargs:
+                tables["nargs"][f"{path}|{flag}"] = str(value.nargs)
+            add_value(f"{path}|{flag}", value)
+        fixed = [value for value in node.positionals if value.nargs != VARIADIC]
+        tables["npos"][path] = str(len(fixed))
+        if len(fixed) < len(node.positionals):
+            tables["vpos"][path] = "1"
+        for position, value in enumerate(node.positionals):
+            add_value(f"{path}|#{position}", value)
+    return tables
+
+
+_BASH = r"""# bash completion for @PROG@, generated by argtyper.completion
+@FUNC@() {
+    local -A subs=(@SUBS@)
+    local -A opts=(@OPTS@)
+    local -A nargs=(@NARGS@)
+    local -A choices=(@CHOICES@)
+    local -A dynamic=(@DYNAMIC@)
+    local -A npos=(@NPOS@)
+    local -A vpos=(@VPOS@)
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    local cmd=/ expect=0 option= pos=0 word i key= candidates=
+    for ((i = 1; i < COMP_CWORD; i++)); do
+        word=${COMP_WORDS[i]}
+        [[ $word == = ]] && continue
+        if ((expect > 0)); then
+            ((expect--))
+            continue
+        fi
+        if ((expect < 0)) && [[ $word != -* ]]; then
+            continue
+        fi
+        expect=0
+        if [[ $word == -?* ]]; then
+            option=$word
+            expect=${nargs[$cmd|$word]:-0}
+            continue
+        fi
+        if ((pos < ${npos[$cmd]:-0})); then
+            ((pos++))
+        elif [[ " ${subs[$cmd]} " == *" $word "* ]]; then
+            cmd=$cmd$word/
+            pos=0
+        else
+            ((pos++))
+        fi
+    done
+    [[ $cur == *=* ]] && return
+    if ((expect > 0)) || { ((expect < 0)) && [[ $cur != -* ]]; }; then
+        key="$cmd|$option"
+    elif [[ $cur == -* ]]; then
+        candidates=${opts[$cmd]}
+    elif ((pos < ${npos[$cmd]:-0})); then
+        key="$cmd|#$pos"
+    else
+        candidates=${subs[$cmd]}
+        [[ -n ${vpos[$cmd]} ]] && key="$cmd|#${npos[$cmd]}"
+    fi
+    if [[ -n $key && -n ${dynamic[$key]} ]]; then
+        local IFS=$'\n'
+        COMPREPLY=($(compgen -W "$(@CALLBACK@ "$cmd" "${dynamic[$key]}" "$cur" 2>/dev/null)" -- "$cur"))
+        return
+    fi
+    [[ -n $key ]] && candidates="$candidates ${choices[$key]}"
+    COMPREPLY=($(compgen -W "$candidates" -- "$cur"))
+}
+complete -o default -F @FUNC@ @PROG@
+"""
+
+_ZSH = r"""#compdef @PROG@
+# zsh completion for @PROG@, generated by argtyper.completion
+@FUNC@() {
+    local -A subs opts nargs choices dynamic npos vpos
+    subs=(@SUBS@)
+    opts=(@OPTS@)
+    nargs=(@NARGS@)
+    choices=(@CHOICES@)
+    dynamic=(@DYNAMIC@)
+    npos=(@NPOS@)
+    vpos=(@VPOS@)
+    local cur=${words[CURRENT]}
+    local cmd=/ expect=0 option= pos=0 word i key= candidates=
+    for ((i = 2; i < CURRENT; i++)); do
+        word=${words[i]}
+        if ((expect > 0)); then
+            ((expect--))
+            continue
+        fi
+        if ((expect < 0)) && [[ $word != -* ]]; then
+            continue
+        fi
+        expect=0
+        if [[ $word == -?* ]]; then
+            option=$word
+            [[ $word == *=* ]] || expect=${nargs[$cmd|$word]:-0}
+            continue
+        fi
+        if ((pos < ${npos[$cmd]:-0})); then
+            ((pos++))
+        elif [[ " ${subs[$cmd]} " == *" $word "* ]]; then
+            cmd=$cmd$word/
+            pos=0
+        else
+            ((pos++))
+        fi
+    done
+    [[ $cur == *=* ]] && return 1
+    if ((expect > 0)) || { ((expect < 0)) && [[ $cur != -* ]]; }; then
+        key="$cmd|$option"
+    elif [[ $cur == -* ]]; then
+        candidates=${opts[$cmd]}
+    elif ((pos < ${npos[$cmd]:-0})); then
+        key="$cmd|#$pos"
+    else
+        candidates=${subs[$cmd]}
+        [[ -n ${vpos[$cmd]} ]] && key="$cmd|#${npos[$cmd]}"
+    fi
+    if [[ -n $key && -n ${dynamic[$key]} ]]; then
+        compadd -- ${(f)"$(@CALLBACK@ "$cmd" "${dynamic[$key]}" "$cur" 2>/dev/null)"}
+        return
+    fi
+    [[ -n $key ]] && candidates="$candidates ${choices[$key]}"
+    if [[ -n ${candidates// /} ]]; then
+        compadd -- ${=candidates}
+    else
+        _files
+    fi
+}
+compdef @FUNC@ @PROG@
+"""
+
+_FISH = r"""# fish completion for @PROG@, generated by argtyper.completion
+function @FUNC@_data
+    switch $argv[1]
+@DATA@
+    end
+end
+
+function @FUNC@
+    set -l tokens (commandline -opc)
+    set -l cur (commandline -ct)
+    set -l cmd /
+    set -l expect 0
+    set -l option
+    set -l pos 0
+    for word in $tokens[2..-1]
+        if test $expect -gt 0
+            set expect (math $expect - 1)
+            continue
+        end
+        if test $expect -lt 0; and not string match -q -- '-*' $word
+            continue
+        end
+        set expect 0
+        if string match -q -- '-?*' $word
+            set option $word
+            if not string match -q -- '*=*' $word
+                set expect (@FUNC@_data "nargs|$cmd|$word")
+                test -n "$expect"; or set expect 0
+            end
+            continue
+        end
+        set -l npos (@FUNC@_data "npos|$cmd")
+        if test $pos -lt $npos
+            set pos (math $pos + 1)
+        else if contains -- $word (string split ' ' -- (@FUNC@_data "subs|$cmd"))
+            set cmd "$cmd$word/"
+            set pos 0
+        else
+            set pos (math $pos + 1)
+        end
+    end
+    string match -q -- '*=*' $cur; and return
+    set -l key
+    set -l candidates
+    set -l npos (@FUNC@_data "npos|$cmd")
+    if test $expect -gt 0; or begin; test $expect -lt 0; and not string match -q -- '-*' $cur; end
+        set key "$cmd|$option"
+    else if string match -q -- '-*' $cur
+        set candidates (string split ' ' -- (@FUNC@_data "opts|$cmd"))
+    else if test $pos -lt $npos
+        set key "$cmd|#$pos"
+    else
+        set candidates (string split ' ' -- (@FUNC@_data "subs|$cmd"))
+        set -l vpos (@FUNC@_data "vpos|$cmd")
+        test -n "$vpos"; and set key "$cmd|#$npos"
+    end
+    if test -n "$key"
+        set -l param (@FUNC@_data "dynamic|$key")
+        if test -n "$param"
+            @CALLBACK@ "$cmd" "$param" "$cur" 2>/dev/null
+            return
+        end
+        set -a candidates (string split ' ' -- (@FUNC@_data "choices|$key"))
+    end
+    set candidates (string match -v -- '' $candidates)
+    if test (count $candidates) -gt 0
+        printf '%s\n' $candidates
+    else
+        __fish_complete_path $cur
+    end
+end
+
+complete -c @PROG@ -f -a '(@FUNC@)'
+"""
+
+
+def _fish_data(tables: Dict[str, Dict[str, str]]) -> str:
+    lines = []
+    for table, entries in tables.items():
+        for key, value in entries.items():
+            lines.append(f"        case {shlex.quote(f'{table}|{key}')}")
+            lines.append(f"            echo {shlex.quote(value)}")
+    return "\n".join(lines)
+
+
+def generate_script(
+    command: Union[ArgTyper, Callable],
+    shell: Shell = "bash",
+    prog: Optional[str] = None,
+    target: Optional[str] = None,
+    python: Optional[str] = None,
+) -> str:
+    """Create a completion script for a command
+
+    Args:
+        command: An ArgTyper instance, or the function of the main command
+        shell: The shell to create the script for
+        prog: The name of the executable to complete (default: the ``prog`` of the main parser)
+        target: The import path (``module:function``) of the command, which is used to call the ``completer`` of
+            dynamic parameters. Only needed if there are such parameters and the path can't be determined
+        python: The python interpreter to run the completers with (default: the current interpreter)
+
+    Raises:
+        ArgTyperException: If there are dynamic parameters, but no import path for the command
+    """
+    at = command if isinstance(command, ArgTyper) else ArgTyper(command)
+    root = build_tree(at)
+    prog = prog or at.get_parser().prog
+    callback = "false"
+    if root.has_dynamic():
+        target = target or object_ref(at.command_function)
+        if not target:
+            raise ArgTyperException(
+                "The command has parameters with a completer, but can't be imported. Set 'target'"
+            )
+        callback = " ".join(
+            shlex.quote(part)
+            for part in [python or sys.executable, "-m", "argtyper.completion", "complete", target]
+        )
+
+    tables = _tables(root)
+    replacements = {
+        "@PROG@": shlex.quote(prog),
+        "@FUNC@": "_argtyper_" + re.sub(r"\W", "_", prog),
+        "@CALLBACK@": callback,
+    }
+    if shell == "fish":
+        template = _FISH
+        replacements["@DATA@"] = _fish_data(tables)
+    elif shell in ("bash", "zsh"):
+        template = _BASH if shell == "bash" else _ZSH
+        for table, entries in tables.items():
+            if shell == "bash":
+                items = (f"[{shlex.quote(k)}]={shlex.quote(v)}" for k, v in entries.items())
+            else:
+                items = (f"{shlex.quote(k)} {shlex.quote(v)}" for k, v in entries.items())
+            replacements[f"@{table.upper()}@"] = " ".join(items)
+    else:
+        raise ArgTyperException(f"Unsupported shell '{shell}'")
+
+    for placeholder, value in replacements.items():
+        template = template.replace(placeholder, value)
+    return template
+
+
+def complete_dynamic(func: Callable, path: Sequence[str], param: str, prefix: str) -> List[str]:
+    """Call the ``completer`` of a parameter
+
+    Only the attributes of the functions are used, the parser is not created.
+
+    Args:
+        func: The function of the main command
+        path: The names of the subcommands leading to the command of the parameter
+        param: The name of the parameter
+        prefix: The beginning of the value which is completed
+    """
+    for name in path:
+        for subcommand in SubCommand.get(func, default=[]):
+            if subcommand.name == name:
+                func = subcommand.get_subfunction(func)
+                break
+        else:
+            return []
+    completer = _get_completers(func).get(param)
+    if completer is None:
+        return []
+    return [str(value) for value in completer(prefix)]
+
+
+def _load(target: str) -> ArgTyper:
+    # Like argtyper.batch.load_argtyper, without importing the modules needed for batches
+    obj = resolve_ref(target)
+    return obj if isinstance(obj, ArgTyper) else ArgTyper(obj)
+
+
+def script(
+    target: str,
+    shell: Shell = "bash",
+    prog: str = None,
+    python: str = None,
+) -> None:
+    """Print the completion script for a command
+
+    Args:
+        target: The command as 'module:function'
+        shell: The shell to create the script for
+        prog: The name of the executable to complete
+        python: The python interpreter used for parameters with a completer
+    """
+    at = _load(target)
+    print(generate_script(at, shell, prog, target, python), end="")
+
+
+def complete(target: str, path: str, param: str, prefix: str) -> None:
+    """Print the values for a parameter with a completer (called by the completion scripts)
+
+    Args:
+        target: The command as 'module:function'
+        path: The path of the command as used in the scripts, e.g. '/sub/'
+        param: The name of the parameter
+        prefix: The beginning of the value
+    """
+    at = _load(target)
+    names = [name for name in path.split("/") if name]
+    for value in complete_dynamic(at.command_function, names, param, prefix):
+        print(value)
+
+
+@Command(
+    prog="python -m argtyper.completion",
+    description="Create static completion scripts for bash, zsh and fish",
+)
+@SubCommand(script)
+@SubCommand(complete)
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    ArgTyper(main)()
@@ -0,0 +1,85 @@
+""" Map the results of the parser to function calls """
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from .base import Command
+
+
+def get_function_key(subcommand_level: int) -> str:
+    """ The name used to store the function of a subcommand inside the parser namespace """
+    return f"_argtyper_function_{subcommand_level}"
+
+
+class DispatchPlan:
+    """Maps the namespace returned by the parser to the functions to call and their keyword arguments
+
+    The plan is filled while the parser is created, so turning a namespace into function calls
+    is a single pass over the namespace.
+    """
+
+    def __init__(self) -> None:
+        # namespace key -> (subcommand level, parameter name)
+        self.targets: Dict[str, Tuple[int, str]] = {}
+        # namespace key -> subcommand level
+        self.function_keys: Dict[str, int] = {}
+        self.hardcoded_args: Dict[Command, Dict[str, Any]] = {}
+        # function -> names of the subcommands leading to it
+        self.paths: Dict[Callable, Tuple[str, ...]] = {}
+
+    def add_argument(self, dest: str, subcommand_level: int, name: str) -> None:
+        """ Pass the value of ``dest`` as parameter ``name`` to the command at ``subcommand_level`` """
+        self.targets[dest] = (subcommand_level, name)
+
+    def add_alias(self, alias: str, dest: str) -> None:
+        """ Handle the value of ``alias`` as if it was stored in ``dest`` """
+        self.targets[alias] = self.targets[dest]
+
+    def add_function(self, subcommand_level: int) -> str:
+        """ Register a subcommand level and return the namespace key for its function """
+        key = get_function_key(subcommand_level)
+        self.function_keys[key] = subcommand_level
+        return key
+
+    def add_path(self, func: Callable, path: Tuple[str, ...]) -> None:
+        """ Remember the path of subcommand names, under which ``func`` is called """
+        self.paths[func] = path
+
+    def get_path(self, func: Callable) -> Tuple[str, ...]:
+        """ The path of ``func`` (see :py:meth:`add_path`), or ``()`` if it is unknown """
+        return self.paths.get(func, ())
+
+    def add_hardcoded(self, command: Command, values: Dict[str, Any]) -> None:
+        """ Always pass ``values`` as keyword arguments to the function of ``command`` """
+        self.hardcoded_args.setdefault(command, {}).update(values)
+
+    def get_function_calls(
+        self, func: Callable, namespace: Dict[str, Any]
+    ) -> List[Tuple[Callable, Dict[str, Any]]]:
+        """Return the calls for a parsed namespace, starting with the main function ``func``
+
+        Returns:
+            A list of ``(function, kwargs)`` ordered from the main command to the last subcommand
+        """
+        functions: Dict[int, Callable] = {0: func}
+        kwargs: Dict[int, Dict[str, Any]] = {}
+        for key, value in namespace.items():
+            target = self.targets.get(key)
+            if target is not None:
+                level, name = target
+                kwargs.setdefault(level, {})[name] = value
+                continue
+            level = self.function_keys.get(key)
+            if level is not None:
+                functions[level] = value
+
+        calls = []
+        for level in sorted(functions):
+            function = functions[level]
+            command = Command.get(function, raise_exc=True)
+            calls.append(
+                (
+                    function,
+                    kwargs.get(level, {}) | self.hardcoded_args.get(command, {}),
+                )
+            )
+        return calls
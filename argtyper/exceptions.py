@@ -23,17 +23,27 @@ class ArgTyperArgumentException(ArgTyperException):
         )
 
 
+class SpecCacheException(ArgTyperException):
+    """ Thrown if the specification of a parser can not be stored in the cache """
+
+    ...
+
+
 class ArgParserException(Exception):
     """Thrown on Parser errors
 
     Args:
         parser: The ArgParser instance that raised this errors
         message: Optional error message
+        output: The messages printed by the parser during this call (e.g. help or usage)
     """
 
-    def __init__(self, parser: "ArgParser", message: Optional[Text]):
+    def __init__(
+        self, parser: "ArgParser", message: Optional[Text], output: Text = ""
+    ):
         self.parser = parser
         self.message = message
+        self.output = output
         super().__init__(f"{self.parser.prog}: {message}")
 
 
@@ -44,10 +54,18 @@ class ArgParserExitException(Exception):
         parser: The ArgParser instance that raised this errors
         status: Status/Exit code of the ArgParser
         message: Optional error message
+        output: The messages printed by the parser during this call (e.g. help or version)
     """
 
-    def __init__(self, parser: "ArgParser", status: int, message: Optional[Text]):
+    def __init__(
+        self,
+        parser: "ArgParser",
+        status: int,
+        message: Optional[Text],
+        output: Text = "",
+    ):
         self.parser = parser
         self.status = status
         self.message = message
+        self.output = output
         super().__init__(f"{self.parser.prog} exited with status {status} ({message})")
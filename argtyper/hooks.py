@@ -0,0 +1,185 @@
+""" Observe where ArgTyper spends its time
+
+Observers are called with an :py:class:`Event` for every phase of building a parser, parsing arguments and calling
+the functions. As long as no observer is registered, the phases are not timed at all.
+
+The phases are
+
+- ``command``: adding the arguments and subcommands of a command to its parser. Includes the following phases
+  of the command (and ``command`` of its subcommands, unless they are created lazily)
+- ``signature``: inspecting the signature and the decorators of the function of a command
+- ``parameter``: turning a parameter into the options of an argument (once per parameter)
+- ``add_argument``: adding an argument to the parser (once per argument)
+- ``subcommands``: adding the parsers of all subcommands of a command
+- ``parse``: parsing an argument list (including help and error messages)
+- ``remap``: mapping the parsed namespace to the function calls
+- ``dispatch``: calling one of the functions
+
+The signature, parameters and arguments are not inspected again, if they are loaded from a ``spec_cache`` file,
+and invocations served by a ``result_cache`` are not parsed. Neither shows up in the events.
+
+The default :py:class:`Collector` can be enabled without changing the code, by setting the environment variable
+``ARGTYPER_PROFILE`` to ``stderr`` or to the path of a file. A summary is written there when the program exits.
+"""
+
+import atexit
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+PHASES = (
+    "command",
+    "signature",
+    "parameter",
+    "add_argument",
+    "subcommands",
+    "parse",
+    "remap",
+    "dispatch",
+)
+
+Observer = Callable[["Event"], None]
+
+# The registered observers. Replaced as a whole by add_observer and remove_observer, so it can be iterated
+# (and checked for being empty) without a lock
+observers: Tuple[Observer, ...] = ()
+_lock = threading.Lock()
+
+
+class Event:
+    """A phase, which has been completed
+
+    Args:
+        phase: One of :py:data:`PHASES`
+        path: The names of the subcommands leading to the command, e.g. ``()`` for the main command.
+            For ``parse`` and ``remap``, the selected command (``()`` if parsing failed)
+        duration: The duration of the phase in seconds
+        detail: The parameter name for ``parameter`` and ``add_argument``, the qualified name of the function
+            for ``dispatch``, otherwise `None`
+    """
+
+    __slots__ = ("phase", "path", "duration", "detail")
+
+    def __init__(
+        self,
+        phase: str,
+        path: Tuple[str, ...],
+        duration: float,
+        detail: Optional[str] = None,
+    ):
+        self.phase = phase
+        self.path = path
+        self.duration = duration
+        self.detail = detail
+
+    def __repr__(self) -> str:
+        return f"Event({self.phase!r}, {self.path!r}, {self.duration!r}, {self.detail!r})"
+
+
+def add_observer(observer: Observer) -> Observer:
+    """ Call ``observer`` with every :py:class:`Event` from now on. Returns the observer, so it can be used as decorator """
+    global observers
+    with _lock:
+        observers = observers + (observer,)
+    return observer
+
+
+def remove_observer(observer: Observer) -> None:
+    """ Stop calling ``observer`` """
+    global observers
+    with _lock:
+        remaining = list(observers)
+        remaining.remove(observer)
+        observers = tuple(remaining)
+
+
+def emit(
+    phase: str, path: Tuple[str, ...], duration: float, detail: Optional[str] = None
+) -> None:
+    """ Pass an event to all observers. Only called, if there are observers """
+    event = Event(phase, path, duration, detail)
+    for observer in observers:
+        observer(event)
+
+
+class Collector:
+    """An observer, which counts the events and sums up their durations per phase and command
+
+    Register it with :py:func:`add_observer`, and use :py:meth:`summary` or :py:meth:`dump` to show the results.
+    The collector can be shared between threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (phase, path) -> [count, total duration, max. duration]
+        self.stats: Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+
+    def __call__(self, event: Event) -> None:
+        key = (event.phase, event.path)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                self.stats[key] = [1, event.duration, event.duration]
+                return
+            stats[0] += 1
+            stats[1] += event.duration
+            if event.duration > stats[2]:
+                stats[2] = event.duration
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stats = {}
+
+    def summary(self) -> str:
+        """ A table of the counts and durations of all phases, and of every command within the phases """
+        with self._lock:
+            stats = {key: list(value) for key, value in self.stats.items()}
+        order = {phase: index for index, phase in enumerate(PHASES)}
+        lines = [
+            f"{'phase':<14}{'command':<30}{'count':>8}{'total ms':>12}{'mean us':>12}{'max us':>12}"
+        ]
+        phases = sorted({phase for phase, _ in stats}, key=lambda p: order.get(p, len(order)))
+        for phase in phases:
+            rows = sorted(
+                ((path, value) for (name, path), value in stats.items() if name == phase),
+                key=lambda row: -row[1][1],
+            )
+            count = sum(value[0] for _, value in rows)
+            total = sum(value[1] for _, value in rows)
+            longest = max(value[2] for _, value in rows)
+            rows.insert(0, (None, [count, total, longest]))
+            for path, (count, total, longest) in rows:
+                command = "(all)" if path is None else " ".join(path) or "(main)"
+                lines.append(
+                    f"{phase if path is None else '':<14}{command:<30}{int(count):>8}"
+                    f"{total * 1e3:>12.3f}{total / count * 1e6:>12.1f}{longest * 1e6:>12.1f}"
+                )
+        return "\n".join(lines)
+
+    def dump(self, file: Optional[TextIO] = None) -> None:
+        """ Write the summary to ``file`` (default: stderr), unless nothing has been collected """
+        if self.stats:
+            print(self.summary(), file=file or sys.stderr)
+
+
+def _install_from_environment() -> Optional[Collector]:
+    target = os.environ.get("ARGTYPER_PROFILE")
+    if not target:
+        return None
+    collector = Collector()
+    add_observer(collector)
+
+    def dump() -> None:
+        if target.lower() in ("1", "-", "stderr"):
+            collector.dump(sys.stderr)
+            return
+        with open(target, "a", encoding="utf-8") as f:
+            collector.dump(f)
+
+    atexit.register(dump)
+    return collector
+
+
+# The collector registered because of ARGTYPER_PROFILE, otherwise `None`
+profile = _install_from_environment()
@@ -0,0 +1,343 @@
+""" A faster replacement for the argument matching of argparse
+
+:py:class:`NativeParser` parses argument lists for an existing :py:class:`argtyper.base.ArgParser` in a single pass
+over the arguments, using the option table of the parser directly instead of building and matching regular
+expression patterns. Values are still converted and stored by the argparse actions of the parser, so the results
+are the same as with :py:meth:`argparse.ArgumentParser.parse_args`.
+
+Everything outside of the common cases (e.g. ``--``, ambiguous or short abbreviated options, combined short options,
+``nargs="?"`` positionals, unknown arguments or any error) is handed to argparse, which then parses the complete
+argument list again. That way, errors, help and usage messages are always created by argparse itself.
+
+Since the fallback converts and stores the values of the arguments again, parsers with actions or types that could
+have side effects (e.g. custom :class:`argparse.Action` subclasses or :class:`argparse.FileType`) are always parsed
+by argparse. Actions of argparse and ArgTyper, and types which are classes from the standard library modules in
+:py:data:`PURE_MODULES` or enums, are considered free of side effects. Other types can be added to
+:py:data:`pure_types`.
+"""
+
+import sys
+from enum import Enum
+from argparse import (
+    PARSER,
+    REMAINDER,
+    SUPPRESS,
+    Action,
+    ArgumentError,
+    Namespace,
+    _SubParsersAction,
+    _UNRECOGNIZED_ARGS_ATTR,
+)
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .base import ArgParser
+from .exceptions import ArgParserException
+from .prefix import PrefixSubParsersAction
+
+# (action, option string, explicit argument) as returned by ArgumentParser._parse_optional
+OptionTuple = Tuple[Optional[Action], str, Optional[str]]
+
+
+# Modules whose classes can be used as type without side effects
+PURE_MODULES = frozenset(
+    ("builtins", "pathlib", "decimal", "fractions", "uuid", "ipaddress")
+)
+# Modules whose actions can be called without side effects
+_PURE_ACTION_MODULES = frozenset(("argparse", "argtyper.actions", "argtyper.prefix"))
+
+# Additional types (or other callables) which convert arguments without side effects
+pure_types: Set[Any] = set()
+
+
+class _Fallback(Exception):
+    """ Raised if the input has to be parsed by argparse """
+
+
+def _is_pure_type(value_type: Any) -> bool:
+    if value_type is None or value_type in pure_types:
+        return True
+    if not isinstance(value_type, type):
+        return False
+    return issubclass(value_type, Enum) or value_type.__module__ in PURE_MODULES
+
+
+def _is_pure(parser: ArgParser) -> bool:
+    """ Check if the actions of a parser can be run twice, without side effects """
+    for action in parser._actions:
+        if type(action).__module__ not in _PURE_ACTION_MODULES:
+            return False
+        types = [action.type]
+        types.extend(getattr(action, "metavar_types", ()))
+        types.extend(type(choice) for choice in getattr(action, "_choices", ()))
+        if not all(_is_pure_type(value_type) for value_type in types):
+            return False
+    return True
+
+
+def _is_supported(parser: ArgParser) -> bool:
+    if parser.fromfile_prefix_chars is not None:
+        return False
+    positionals = parser._get_positional_actions()
+    for index, action in enumerate(positionals):
+        nargs = action.nargs
+        if nargs == PARSER:
+            if index != len(positionals) - 1:
+                return False
+        elif not (nargs is None or (isinstance(nargs, int) and nargs > 0)):
+            return False
+    for action in parser._get_optional_actions():
+        if action.nargs in (PARSER, REMAINDER):
+            return False
+    return True
+
+
+class NativeParser:
+    """Parses argument lists for an ArgParser without the pattern matching of argparse
+
+    Parsers of subcommands are compiled the first time they are used. Subcommands with features this class
+    does not handle (see :py:mod:`argtyper.native`) are parsed by argparse, while the rest of the command line is
+    still parsed natively. If the input can not be handled, :py:meth:`parse_args` falls back to argparse.
+    Input for parsers (or subcommands) with actions or types which might have side effects is always parsed by
+    argparse alone, so nothing is run twice.
+
+    The tables of the parser (options, positionals, defaults) are read once, so the parser must not be changed
+    after the NativeParser was created.
+
+    Args:
+        parser: The parser to replace
+    """
+
+    def __init__(self, parser: ArgParser):
+        parser.materialize()
+        self.parser = parser
+        self.supported = _is_supported(parser)
+        self.pure = _is_pure(parser)
+        self.options = parser._option_string_actions
+        self.index = parser.get_option_index()
+        self.positionals = parser._get_positional_actions()
+        self.conflicts: Dict[Action, List[Action]] = {}
+        for group in parser._mutually_exclusive_groups:
+            for index, action in enumerate(group._group_actions):
+                conflicts = self.conflicts.setdefault(action, [])
+                conflicts.extend(group._group_actions[:index])
+                conflicts.extend(group._group_actions[index + 1 :])
+        # The namespace every parse starts with (see ArgumentParser.parse_known_args)
+        self.defaults: Dict[str, Any] = {}
+        for action in parser._actions:
+            if action.dest is not SUPPRESS and action.dest not in self.defaults:
+                if action.default is not SUPPRESS:
+                    self.defaults[action.dest] = action.default
+        for dest, value in parser._defaults.items():
+            self.defaults.setdefault(dest, value)
+        self.required = [action for action in parser._actions if action.required]
+        self.string_defaults = [
+            action
+            for action in parser._actions
+            if isinstance(action.default, str) and not action.required
+        ]
+        self._children: Dict[ArgParser, "NativeParser"] = {}
+
+    def parse_args(self, args: Optional[Sequence[str]] = None) -> Namespace:
+        """ Same as :py:meth:`argparse.ArgumentParser.parse_args` """
+        if args is None:
+            args = sys.argv[1:]
+        if self.supported and self.pure:
+            try:
+                namespace = self._parse(args)
+            except (_Fallback, ArgumentError, ArgParserException):
+                pass
+            else:
+                if not hasattr(namespace, _UNRECOGNIZED_ARGS_ATTR):
+                    return namespace
+        return self.parser.parse_args(args)
+
+    def _child(self, parser: ArgParser) -> "NativeParser":
+        child = self._children.get(parser, None)
+        if child is None:
+            child = self._children[parser] = NativeParser(parser)
+        return child
+
+    def _match_abbreviation(self, arg: str) -> Optional[OptionTuple]:
+        """Return the option for an unambiguous abbreviation of a long option without explicit argument
+
+        Raises _Fallback for anything else argparse could match to an option by abbreviation,
+        an explicit argument ("=") or as short option with the value attached.
+        """
+        prefix_chars = self.parser.prefix_chars
+        prefix = arg.split("=", 1)[0]
+        matches = self.index.match(prefix)
+        if arg[1] in prefix_chars:
+            if not self.parser.allow_abbrev or not matches:
+                return None
+            if len(matches) == 1 and prefix == arg:
+                return self.options[matches[0]], matches[0], None
+            raise _Fallback()
+        if matches or arg[:2] in self.options:
+            raise _Fallback()
+        return None
+
+    def _classify(self, args: Sequence[str]) -> List[Optional[OptionTuple]]:
+        """ Mirrors ArgumentParser._parse_optional: `None` for arguments, an option tuple for options """
+        parser = self.parser
+        options = self.options
+        prefix_chars = parser.prefix_chars
+        kinds: List[Optional[OptionTuple]] = []
+        for arg in args:
+            if not arg or arg[0] not in prefix_chars:
+                kinds.append(None)
+            elif arg in options:
+                kinds.append((options[arg], arg, None))
+            elif len(arg) == 1:
+                kinds.append(None)
+            elif arg == "--":
+                raise _Fallback()
+            elif "=" in arg and arg.split("=", 1)[0] in options:
+                option_string, explicit_arg = arg.split("=", 1)
+                kinds.append((options[option_string], option_string, explicit_arg))
+            else:
+                option = self._match_abbreviation(arg)
+                if option is not None:
+                    kinds.append(option)
+                elif (
+                    parser._negative_number_matcher.match(arg)
+                    and not parser._has_negative_number_optionals
+                ):
+                    kinds.append(None)
+                elif " " in arg:
+                    kinds.append(None)
+                else:
+                    kinds.append((None, arg, None))
+        return kinds
+
+    def _parse(self, args: Sequence[str]) -> Namespace:
+        """ Mirrors ArgumentParser.parse_known_args, but raises _Fallback instead of collecting extras """
+        parser = self.parser
+        parser._message = ""
+        namespace = Namespace()
+        namespace.__dict__.update(self.defaults)
+
+        kinds = self._classify(args)
+        positionals = list(self.positionals)
+        seen_actions = set()
+        seen_non_default_actions = set()
+
+        def take_action(action: Action, arg_strings: List[str], option_string=None):
+            seen_actions.add(action)
+            if isinstance(action, _SubParsersAction) and action.type is None:
+                # Subcommand names and their arguments are not converted, only the name is checked
+                parser._check_value(action, arg_strings[0])
+                seen_non_default_actions.add(action)
+                self._call_subparser(action, namespace, arg_strings)
+                return
+            values = parser._get_values(action, arg_strings)
+            if values is not action.default:
+                seen_non_default_actions.add(action)
+                for conflict in self.conflicts.get(action, ()):
+                    if conflict in seen_non_default_actions:
+                        raise _Fallback()
+            if values is SUPPRESS:
+                return
+            if isinstance(action, _SubParsersAction):
+                self._call_subparser(action, namespace, values)
+            else:
+                action(parser, namespace, values, option_string)
+
+        count = len(args)
+        index = 0
+        while index < count:
+            kind = kinds[index]
+            if kind is None:
+                # Consume as many positionals as possible with the arguments in front of the next option
+                end = index
+                while end < count and kinds[end] is None:
+                    end += 1
+                available = end - index
+                matched: List[Tuple[Action, int]] = []
+                for action in positionals:
+                    if action.nargs == PARSER:
+                        if available > 0:
+                            matched.append((action, count - end + available))
+                        break
+                    needed = 1 if action.nargs is None else action.nargs
+                    if needed > available:
+                        break
+                    matched.append((action, needed))
+                    available -= needed
+                if not matched:
+                    raise _Fallback()
+                del positionals[: len(matched)]
+                for action, arg_count in matched:
+                    take_action(action, list(args[index : index + arg_count]))
+                    index += arg_count
+                continue
+
+            action, option_string, explicit_arg = kind
+            if action is None:
+                raise _Fallback()
+            nargs = action.nargs
+            if explicit_arg is not None:
+                if not (nargs is None or nargs in ("?", "*", "+", 1)):
+                    raise _Fallback()
+                take_action(action, [explicit_arg], option_string)
+                index += 1
+                continue
+
+            start = index + 1
+            end = start
+            while end < count and kinds[end] is None:
+                end += 1
+            available = end - start
+            if nargs is None:
+                arg_count = 1
+            elif nargs == "?":
+                arg_count = min(available, 1)
+            elif nargs in ("*", "+"):
+                arg_count = available
+                if nargs == "+" and not available:
+                    raise _Fallback()
+            else:
+                arg_count = nargs
+            if arg_count > available:
+                raise _Fallback()
+            take_action(action, list(args[start : start + arg_count]), option_string)
+            index = start + arg_count
+
+        for action in self.required:
+            if action not in seen_actions:
+                raise _Fallback()
+        for action in self.string_defaults:
+            if (
+                action not in seen_actions
+                and hasattr(namespace, action.dest)
+                and action.default is getattr(namespace, action.dest)
+            ):
+                setattr(
+                    namespace, action.dest, parser._get_value(action, action.default)
+                )
+
+        for group in parser._mutually_exclusive_groups:
+            if group.required and not any(
+                action in seen_non_default_actions for action in group._group_actions
+            ):
+                raise _Fallback()
+        return namespace
+
+    def _call_subparser(
+        self, action: _SubParsersAction, namespace: Namespace, values: List[str]
+    ) -> None:
+        """ Mirrors _SubParsersAction.__call__ """
+        name = values[0]
+        if isinstance(action, PrefixSubParsersAction):
+            name = action.resolve(name)
+        child = self._child(action._name_parser_map[name])
+        if not child.pure:
+            # The rest of the command line has to be parsed by argparse, which would run the actions of the
+            # subcommand again in case of a fallback
+            raise _Fallback()
+        if not child.supported:
+            action(self.parser, namespace, values)
+            return
+        if action.dest is not SUPPRESS:
+            setattr(namespace, action.dest, name)
+        subnamespace = child._parse(values[1:])
+        namespace.__dict__.update(vars(subnamespace))
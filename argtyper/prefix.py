@@ -0,0 +1,90 @@
+""" Find option strings and subcommand names by prefix without scanning all of them """
+
+import argparse
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Mapping
+
+
+class PrefixIndex:
+    """A sorted index of names, which finds all names starting with a prefix with a binary search
+
+    Matches are returned in the order the names were passed in, so results (and error messages) are the same
+    as for a linear scan over the names.
+
+    Args:
+        names: The names to index
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.order: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        self.names: List[str] = sorted(self.order)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def match(self, prefix: str) -> List[str]:
+        """ Return all names starting with ``prefix`` """
+        names = self.names
+        start = end = bisect_left(names, prefix)
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        matches = names[start:end]
+        if len(matches) > 1:
+            matches.sort(key=self.order.__getitem__)
+        return matches
+
+
+class _SubcommandChoices(Mapping):
+    """ The choices of a :py:class:`PrefixSubParsersAction`, which also contain unique prefixes """
+
+    def __init__(self, action: "PrefixSubParsersAction"):
+        self.action = action
+
+    def __getitem__(self, name: str) -> argparse.ArgumentParser:
+        return self.action._name_parser_map[self.action.resolve(name)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.action._name_parser_map)
+
+    def __len__(self) -> int:
+        return len(self.action._name_parser_map)
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str):
+            return False
+        return self.action.resolve(name) in self.action._name_parser_map
+
+
+class PrefixSubParsersAction(argparse._SubParsersAction):
+    """Subparsers action, which also selects a subcommand by a unique prefix of its name (or alias)
+
+    A prefix matching several subcommands is an error, like an ambiguous abbreviation of an option.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.choices = _SubcommandChoices(self)
+        self._index = PrefixIndex(())
+
+    def resolve(self, name: str) -> str:
+        """Return the subcommand name for a unique prefix. Other names are returned unchanged
+
+        Raises:
+            argparse.ArgumentError: If the prefix matches more than one subcommand
+        """
+        parsers = self._name_parser_map
+        if name in parsers or not name:
+            return name
+        if len(self._index) != len(parsers):
+            self._index = PrefixIndex(parsers)
+        matches = self._index.match(name)
+        if len({id(parsers[match]) for match in matches}) > 1:
+            choices = ", ".join(map(repr, matches))
+            raise argparse.ArgumentError(
+                self, f"ambiguous choice: {name!r} could match {choices}"
+            )
+        return matches[0] if matches else name
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        values = [self.resolve(values[0])] + list(values[1:])
+        super().__call__(parser, namespace, values, option_string)
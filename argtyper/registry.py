@@ -0,0 +1,182 @@
+""" Registries mapping decorated functions to their ArgTyper attributes """
+
+import weakref
+from typing import Any, Callable, Dict, FrozenSet, Iterator, MutableMapping, Optional
+
+
+def unbound(func: Callable) -> Callable:
+    """ Return the function of a bound method, or ``func`` itself """
+    if getattr(func, "__self__", None) is not None and hasattr(func, "__func__"):
+        return func.__func__  # type: ignore
+    return func
+
+
+class Registry(MutableMapping):
+    """A mapping of functions to attributes, which does not keep the functions alive
+
+    Entries are dropped as soon as their function is garbage collected, so registering functions which are
+    created dynamically (e.g. one per request) does not leak memory. Bound methods are stored under their
+    underlying function (``__func__``), since a bound method object is created anew on every attribute access.
+    Callables that can not be referenced weakly are kept with a strong reference instead.
+
+    A registry which is a class attribute (like ``ArgTyperAttribute._registered_functions``) records the
+    functions it holds in the central :py:data:`index` as well, under the class it was defined in.
+    """
+
+    # Changed whenever a function is added to or removed from any registry
+    generation = 0
+
+    def __init__(self) -> None:
+        self._weak: MutableMapping[Callable, Any] = weakref.WeakKeyDictionary()
+        self._strong: Dict[Callable, Any] = {}
+        self.kind: Optional[type] = None
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.kind = owner
+
+    def _mapping(self, func: Callable) -> MutableMapping[Callable, Any]:
+        try:
+            weakref.ref(func)
+        except TypeError:
+            return self._strong
+        return self._weak
+
+    def __getitem__(self, func: Callable) -> Any:
+        func = unbound(func)
+        try:
+            return self._weak[func]
+        except TypeError:
+            return self._strong[func]
+
+    def __setitem__(self, func: Callable, value: Any) -> None:
+        func = unbound(func)
+        self._mapping(func)[func] = value
+        Registry.generation += 1
+        if self.kind is not None:
+            kinds = index.get(func, frozenset())
+            if self.kind not in kinds:
+                index[func] = kinds | {self.kind}
+
+    def __delitem__(self, func: Callable) -> None:
+        func = unbound(func)
+        del self._mapping(func)[func]
+        Registry.generation += 1
+        if self.kind is not None:
+            kinds = index.get(func, frozenset()) - {self.kind}
+            if kinds:
+                index[func] = kinds
+            elif func in index:
+                del index[func]
+
+    def __contains__(self, func: object) -> bool:
+        try:
+            func = unbound(func)  # type: ignore
+            return func in self._mapping(func)  # type: ignore
+        except TypeError:
+            # Unhashable objects are never registered
+            return False
+
+    def __iter__(self) -> Iterator[Callable]:
+        yield from list(self._weak.keys())
+        yield from list(self._strong)
+
+    def __len__(self) -> int:
+        return len(self._weak) + len(self._strong)
+
+    def get(self, func: Callable, default: Any = None) -> Any:
+        try:
+            return self[func]
+        except (KeyError, TypeError):
+            return default
+
+
+# All functions with at least one ArgTyper attribute -> the classes of their attributes
+index = Registry()
+
+
+def get_kinds(func: Callable) -> FrozenSet[type]:
+    """Return the classes of all attributes registered for ``func``
+
+    Like :py:func:`resolve`, this follows bound methods and wrappers, and collects the attributes of all of them.
+    """
+    kinds: FrozenSet[type] = frozenset()
+    while True:
+        kinds |= index.get(func, frozenset())
+        if unbound(func) is not func:
+            func = unbound(func)
+            continue
+        wrapped = getattr(func, "__wrapped__", None)
+        if not wrapped:
+            return kinds
+        func = wrapped
+
+
+def resolve(func: Callable, registry: Registry) -> Optional[Callable]:
+    """Return the function under which the attribute of ``func`` is registered, or `None`
+
+    Follows bound methods (``__func__``) and wrappers (``__wrapped__``, as set by :py:func:`functools.wraps`),
+    until a function with a (non empty) entry in ``registry`` is found.
+    """
+    while True:
+        if registry.get(func, None):
+            return func
+        if unbound(func) is not func:
+            func = unbound(func)
+            continue
+        wrapped = getattr(func, "__wrapped__", None)
+        if wrapped:
+            func = wrapped
+            continue
+        return None
+
+
+class ResolutionCache:
+    """Remembers the result of :py:func:`resolve` for every callable and registry
+
+    All results are dropped as soon as any registry changes. Like the registries, the cache does not keep the
+    callables alive.
+    """
+
+    def __init__(self) -> None:
+        self.generation = Registry.generation
+        # callable -> {id of the registry: weak reference to the resolved function, or None}
+        self._entries: MutableMapping[
+            Callable, Dict[int, Optional[weakref.ref]]
+        ] = weakref.WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries = weakref.WeakKeyDictionary()
+
+    def resolve(self, func: Callable, registry: Registry) -> Optional[Callable]:
+        """ Same as :py:func:`resolve`, but only walks the chain of wrappers once """
+        if self.generation != Registry.generation:
+            # Replaced instead of cleared, so results computed concurrently for an older generation
+            # end up in the discarded mapping
+            self.generation = Registry.generation
+            self.clear()
+        cache = self._entries
+        func = unbound(func)
+        try:
+            entries = cache.get(func, None)
+        except TypeError:
+            # Neither hashable nor weakly referencable, so it can't be cached
+            return resolve(func, registry)
+        if entries is not None and id(registry) in entries:
+            ref = entries[id(registry)]
+            if ref is None:
+                return None
+            resolved = ref()
+            if resolved is not None:
+                return resolved
+
+        resolved = resolve(func, registry)
+        try:
+            if entries is None:
+                entries = cache.setdefault(func, {})
+            entries[id(registry)] = None if resolved is None else weakref.ref(resolved)
+        except TypeError:
+            pass
+        return resolved
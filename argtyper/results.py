@@ -0,0 +1,38 @@
+""" Results of batches of invocations """
+
+from typing import Any, List, Optional, Sequence, Text, Union
+
+Invocation = Union[Text, Sequence[str]]
+
+
+class BatchResult:
+    """The outcome of a single invocation inside a batch
+
+    Args:
+        invocation: The message or argument list which was passed to the batch
+        responses: The responses of the called functions, if the invocation was successful
+        error: The exception raised while parsing the invocation or calling the functions, if any
+        index: The position of the invocation inside the batch
+    """
+
+    def __init__(
+        self,
+        invocation: Invocation,
+        responses: Optional[List[Any]] = None,
+        error: Optional[BaseException] = None,
+        index: Optional[int] = None,
+    ):
+        self.index = index
+        self.invocation = invocation
+        self.responses = responses
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """ `True` if the invocation was parsed and all functions were called without an exception """
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f"BatchResult({self.invocation!r}, responses={self.responses!r})"
+        return f"BatchResult({self.invocation!r}, error={self.error!r})"
@@ -0,0 +1,114 @@
+""" Run coroutines from synchronous code without creating a new event loop for every call """
+
+import os
+import threading
+import weakref
+from types import FunctionType, MethodType
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Optional
+
+from .exceptions import ArgTyperException
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+# inspect.CO_COROUTINE
+_CO_COROUTINE = 0x80
+
+
+def is_coroutine_function(func: Callable) -> bool:
+    """Same as :py:func:`inspect.iscoroutinefunction`
+
+    Plain functions and methods are checked directly, so inspect is only imported for other callables
+    (e.g. :py:func:`functools.partial` objects).
+    """
+    target = func.__func__ if type(func) is MethodType else func  # type: ignore
+    if type(target) is FunctionType and not hasattr(target, "_is_coroutine_marker"):
+        return bool(target.__code__.co_flags & _CO_COROUTINE)
+    import inspect
+
+    return inspect.iscoroutinefunction(func)
+
+
+def is_loop_running() -> bool:
+    """ Check if an event loop is running in the current thread """
+    import asyncio
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class LoopRunner:
+    """Runs coroutines on a single event loop, which is kept alive in a background thread
+
+    The loop and its thread are started with the first coroutine. Coroutines can be submitted from any thread,
+    including threads with a running event loop of their own.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional["asyncio.AbstractEventLoop"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        _runners.add(self)
+
+    def _reset_after_fork(self) -> None:
+        # The thread of the loop does not exist in a forked child process
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> "asyncio.AbstractEventLoop":
+        import asyncio
+
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="argtyper-loop", daemon=True
+                )
+                thread.start()
+                self._thread = thread
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro: Coroutine) -> Any:
+        """ Run a coroutine on the loop, wait for it to finish and return its result """
+        import asyncio
+
+        loop = self._loop or self._start()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise ArgTyperException(
+                "Can not wait for a coroutine from inside the event loop of the runner"
+            )
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self) -> None:
+        """ Stop the loop and its thread. The runner can be used again afterwards, which starts a new loop """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+_runners: "weakref.WeakSet[LoopRunner]" = weakref.WeakSet()
+
+# Used by all ArgTyper instances without a loop of their own (see ``persistent_loop``), if they are called while
+# an event loop is running. Its thread is only started with the first coroutine and is never stopped
+shared_runner = LoopRunner()
+
+
+def _reset_runners_after_fork() -> None:
+    for runner in list(_runners):
+        runner._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_runners_after_fork)
@@ -0,0 +1,201 @@
+""" Keep an ArgTyper resident in a server process and run commands for clients connecting over a Unix socket
+
+Usage: ``python -m argtyper.server module:function SOCKET``
+
+The server imports the command, creates the parser once and then waits for requests from
+:py:mod:`argtyper.client`. Every request is handled in a process forked from the server, so it starts with
+all modules imported and the parser created. The forked process switches to the working directory and
+environment of the client, runs the command with the arguments of the client and streams
+stdout, stderr and the exit status back to the client. Unless the command sets its ``prog`` explicitly, help and
+error messages use the program name of the client.
+
+Standard input is not forwarded: commands run by the server read from ``/dev/null``.
+"""
+
+import argparse
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import traceback
+from typing import Optional, Union
+
+from . import ArgTyper
+from .base import Argument, Command, DEFAULT
+from .batch import load_argtyper
+from .client import (
+    FRAME_EXIT,
+    FRAME_REQUEST,
+    FRAME_STDERR,
+    FRAME_STDOUT,
+    recv_frame,
+    send_frame,
+)
+
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client.py")
+
+
+class _FrameWriter(io.RawIOBase):
+    """ Writes everything as frames of a single kind to the client socket """
+
+    def __init__(self, sock, kind: bytes):
+        self.sock = sock
+        self.kind = kind
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if data:
+            send_frame(self.sock, self.kind, bytes(data))
+        return len(data)
+
+
+def _text_stream(sock, kind: bytes) -> io.TextIOWrapper:
+    return io.TextIOWrapper(
+        io.BufferedWriter(_FrameWriter(sock, kind)),
+        encoding="utf-8",
+        line_buffering=True,
+    )
+
+
+def _exit_status(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _rename_prog(parser: argparse.ArgumentParser, old: str, new: str) -> None:
+    """ Replace the program name ``old`` at the start of the ``prog`` of a parser and all of its subparsers """
+    if parser.prog == old or parser.prog.startswith(old + " "):
+        parser.prog = new + parser.prog[len(old) :]
+    for action in parser._actions:
+        if not isinstance(action, argparse._SubParsersAction):
+            continue
+        prefix = action._prog_prefix
+        if prefix == old or prefix.startswith(old + " "):
+            action._prog_prefix = new + prefix[len(old) :]
+        # Aliases map to the same parser
+        for subparser in {id(p): p for p in action._name_parser_map.values()}.values():
+            _rename_prog(subparser, old, new)
+
+
+class CommandServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """A Unix socket server which runs the command of an ArgTyper for every request in a forked process
+
+    Args:
+        at: The ArgTyper to run
+        socket_path: Path of the Unix socket to listen on. An existing socket file at this path is replaced
+    """
+
+    def __init__(self, at: ArgTyper, socket_path: Union[str, "os.PathLike[str]"]):
+        self.at = at
+        self.socket_path = os.fspath(socket_path)
+        parser = at.get_parser()
+        # The program name of the server, which is replaced by the one of the client (see _CommandHandler)
+        self.prog: Optional[str] = None
+        if isinstance(Command.get_or_create(at.command_function).arg_options["prog"], DEFAULT):
+            self.prog = parser.prog
+        if os.path.exists(self.socket_path) and stat.S_ISSOCK(
+            os.stat(self.socket_path).st_mode
+        ):
+            os.unlink(self.socket_path)
+        super().__init__(self.socket_path, _CommandHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _CommandHandler(socketserver.BaseRequestHandler):
+    server: CommandServer
+
+    def handle(self) -> None:
+        # This runs in the forked process, so changing the global state does not affect the server
+        kind, payload = recv_frame(self.request)
+        if kind != FRAME_REQUEST:
+            return
+        request = json.loads(payload)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = [request["prog"]] + request["argv"]
+        if self.server.prog is not None:
+            _rename_prog(self.server.at.parser, self.server.prog, request["prog"])
+        sys.stdin = open(os.devnull, "r")
+        sys.stdout = _text_stream(self.request, FRAME_STDOUT)
+        sys.stderr = _text_stream(self.request, FRAME_STDERR)
+
+        status = 0
+        try:
+            self.server.at()
+        except SystemExit as exc:
+            status = _exit_status(exc.code)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        send_frame(self.request, FRAME_EXIT, json.dumps(status).encode("utf-8"))
+
+
+def serve(at: ArgTyper, socket_path: Union[str, "os.PathLike[str]"]) -> None:
+    """ Run a :py:class:`CommandServer` until it is interrupted """
+    with CommandServer(at, socket_path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def write_client(
+    path: Union[str, "os.PathLike[str]"],
+    socket_path: Union[str, "os.PathLike[str]"],
+    python: Optional[str] = None,
+) -> None:
+    """Write an executable launcher, which runs commands on the server listening on ``socket_path``
+
+    The launcher starts python without the site module (``-S``) and only imports a few standard library modules.
+
+    Args:
+        path: The file to write the launcher to
+        socket_path: The socket of the server
+        python: The python interpreter to use (default: the current interpreter)
+    """
+    with open(CLIENT_PATH, "r", encoding="utf-8") as f:
+        client = f.read()
+    client = client.replace(
+        'os.environ.get("ARGTYPER_SOCKET")', repr(os.path.abspath(socket_path))
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#!{python or sys.executable} -S\n")
+        f.write(client)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+@Command(
+    prog="python -m argtyper.server",
+    description="Keep a command resident and run it for clients connecting to a Unix socket",
+)
+@Argument("target", help="The command to serve as 'module:function'")
+@Argument("socket_path", help="Path of the Unix socket to listen on")
+@Argument(
+    "client", "--write-client", help="Also write an executable client launcher to this path"
+)
+def main(target: str, socket_path: str, client: str = None) -> None:
+    at = load_argtyper(target)
+    if client:
+        write_client(client, socket_path)
+    serve(at, socket_path)
+
+
+if __name__ == "__main__":
+    ArgTyper(main)()
@@ -0,0 +1,283 @@
+""" A serializable description of the parsers created by ArgTyper, which allows to cache them on disk """
+
+import os
+import sys
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from .exceptions import SpecCacheException
+
+FORMAT_VERSION = 1
+
+
+class ArgumentSpec:
+    """Everything needed to add a function parameter to a parser with ``add_argument``
+
+    Args:
+        param_name: The name of the function parameter
+        dest: The (unique) name of the parameter inside the parser namespace
+        name_or_flags: The names or flags passed to ``add_argument``
+        options: The keyword arguments passed to ``add_argument``
+        groups: Indices of the :py:class:`argtyper.ArgumentGroup` and :py:class:`argtyper.MutuallyExclusiveArgumentGroup`
+            instances of the function this parameter should be added to
+    """
+
+    def __init__(
+        self,
+        param_name: str,
+        dest: str,
+        name_or_flags: Tuple[str, ...],
+        options: Dict[str, Any],
+        groups: List[int],
+    ):
+        self.param_name = param_name
+        self.dest = dest
+        self.name_or_flags = name_or_flags
+        self.options = options
+        self.groups = groups
+
+
+class CommandSpec:
+    """The arguments of a single command, and the specifications of its subcommands
+
+    ``path`` contains the names of the subcommands leading to this command.
+    ``arguments`` is `None` as long as the function of the command has not been inspected.
+    ``hardcoded`` maps parameter names to the type used to look up their hardcoded value, or `None`,
+    if the value is hardcoded by name.
+    ``formatted`` optionally contains the rendered help and usage messages of the parser
+    (see :py:meth:`argtyper.base.ArgParser.get_formatted`), and ``formatted_key`` identifies the configuration
+    they were rendered with.
+    """
+
+    def __init__(self, path: Tuple[str, ...] = (), module: Optional[str] = None):
+        self.path = path
+        self.module = module
+        self.arguments: Optional[List[ArgumentSpec]] = None
+        self.hardcoded: Dict[str, Any] = {}
+        self.remapped_parameters: Dict[str, str] = {}
+        self.subcommands: Dict[str, "CommandSpec"] = {}
+        self.formatted: Dict[str, Tuple[Tuple, str]] = {}
+        self.formatted_key: Optional[str] = None
+
+
+def object_ref(obj: Any) -> Optional[str]:
+    """ Return an import path (``module:qualname``) for an object, or `None` if it can't be imported that way """
+    module = getattr(obj, "__module__", None)
+    qualname = getattr(obj, "__qualname__", None)
+    if not isinstance(module, str) or not isinstance(qualname, str):
+        return None
+    if "<" in qualname:
+        return None
+    try:
+        resolved = resolve_ref(f"{module}:{qualname}")
+    except (ImportError, AttributeError):
+        return None
+    if resolved is not obj:
+        return None
+    return f"{module}:{qualname}"
+
+
+def resolve_ref(ref: str) -> Any:
+    """ Import the object referenced by an import path created with :py:func:`object_ref` """
+    module_name, _, qualname = ref.partition(":")
+    obj = sys.modules.get(module_name)
+    if obj is None:
+        import importlib
+
+        obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _encode(value: Any, modules: Set[str]) -> Any:
+    # Exact type checks, since subclasses (e.g. enums) would not be restored correctly
+    if value is None or type(value) in (bool, int, float, str):
+        return value
+    if type(value) is list:
+        return [_encode(v, modules) for v in value]
+    if type(value) is tuple:
+        return {"tuple": [_encode(v, modules) for v in value]}
+    if type(value) is dict and all(type(k) is str for k in value):
+        return {"dict": {k: _encode(v, modules) for k, v in value.items()}}
+    if isinstance(value, Enum):
+        enum_ref = object_ref(type(value))
+        if enum_ref is not None:
+            modules.add(type(value).__module__)
+            return {"enum": enum_ref, "name": value.name}
+    ref = object_ref(value)
+    if ref is None:
+        raise SpecCacheException(f"Can not store value {value!r} in the cache")
+    modules.add(value.__module__)
+    return {"ref": ref}
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if "tuple" in value:
+            return tuple(_decode(v) for v in value["tuple"])
+        if "dict" in value:
+            return {k: _decode(v) for k, v in value["dict"].items()}
+        if "enum" in value:
+            return resolve_ref(value["enum"])[value["name"]]
+        return resolve_ref(value["ref"])
+    return value
+
+
+def encode_for_key(value: Any) -> Any:
+    """Encode a value like it is stored in the cache file, to use it in the key of the cache (see :py:func:`fingerprint`)
+
+    Values which can't be stored in the file are represented by their type only.
+    """
+    try:
+        return _encode(value, set())
+    except SpecCacheException:
+        return {"unencodable": f"{type(value).__module__}.{type(value).__qualname__}"}
+
+
+def _is_plain(value: Any) -> bool:
+    """ Check if a value is stored in JSON without changes (apart from tuples becoming lists) """
+    if isinstance(value, tuple):
+        return all(_is_plain(v) for v in value)
+    return value is None or isinstance(value, (str, int))
+
+
+def _to_tuple(value: Any) -> Any:
+    if isinstance(value, list):
+        return tuple(_to_tuple(v) for v in value)
+    return value
+
+
+def _encode_command(spec: CommandSpec, modules: Set[str]) -> Dict:
+    if spec.arguments is None:
+        raise SpecCacheException("Command was not inspected")
+    if spec.module:
+        modules.add(spec.module)
+    return {
+        "formatted": {
+            kind: [state, text]
+            for kind, (state, text) in spec.formatted.items()
+            if _is_plain(state)
+        },
+        "formatted_key": spec.formatted_key,
+        "arguments": [
+            {
+                "param_name": argument.param_name,
+                "dest": argument.dest,
+                "name_or_flags": list(argument.name_or_flags),
+                "options": _encode(argument.options, modules),
+                "groups": argument.groups,
+            }
+            for argument in spec.arguments
+        ],
+        "hardcoded": _encode(spec.hardcoded, modules),
+        "remapped_parameters": spec.remapped_parameters,
+        "subcommands": {
+            name: _encode_command(subspec, modules)
+            for name, subspec in spec.subcommands.items()
+        },
+    }
+
+
+def _decode_command(data: Dict, path: Tuple[str, ...] = ()) -> CommandSpec:
+    spec = CommandSpec(path)
+    spec.arguments = [
+        ArgumentSpec(
+            argument["param_name"],
+            argument["dest"],
+            tuple(argument["name_or_flags"]),
+            _decode(argument["options"]),
+            argument["groups"],
+        )
+        for argument in data["arguments"]
+    ]
+    spec.hardcoded = _decode(data["hardcoded"])
+    spec.remapped_parameters = data["remapped_parameters"]
+    spec.formatted = {
+        kind: (_to_tuple(state), text)
+        for kind, (state, text) in data.get("formatted", {}).items()
+    }
+    spec.formatted_key = data.get("formatted_key", None)
+    spec.subcommands = {
+        name: _decode_command(subdata, path + (name,))
+        for name, subdata in data["subcommands"].items()
+    }
+    return spec
+
+
+def _source_stats(modules: Set[str]) -> Dict[str, List[int]]:
+    sources = {}
+    for name in modules:
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if not path:
+            continue
+        stat = os.stat(path)
+        sources[path] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def fingerprint(*values: Any) -> str:
+    """ Hash the ``repr()`` of the given values. Used to identify the configuration a cache entry was created with """
+    import hashlib
+
+    return hashlib.sha256(repr(values).encode("utf-8")).hexdigest()
+
+
+class SpecCache:
+    """Stores the specification of a command tree in a (JSON) file
+
+    The cache is considered stale, if the modification time or size of any of the modules which contain the
+    functions, types or actions of the command tree changed, or if it was created with another key. ArgTyper includes
+    its configuration and the current defaults of all parameters in the key.
+
+    Args:
+        path: The file to store the cache in
+    """
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]):
+        self.path = os.fspath(path)
+
+    def load(self, key: str) -> Optional[CommandSpec]:
+        """Read the cached command tree
+
+        Returns `None` if the file does not exist, can't be read or is stale.
+        """
+        import json
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["version"] != FORMAT_VERSION or data["key"] != key:
+                return None
+            for path, stats in data["sources"].items():
+                stat = os.stat(path)
+                if [stat.st_mtime_ns, stat.st_size] != stats:
+                    return None
+            return _decode_command(data["command"])
+        except (OSError, ValueError, KeyError, TypeError, ImportError, AttributeError):
+            return None
+
+    def store(self, key: str, spec: CommandSpec) -> None:
+        """Write the command tree to the cache file
+
+        Raises:
+            SpecCacheException: If the command tree contains values which can not be stored
+        """
+        import json
+
+        modules = {"argtyper", "argtyper.actions", "argtyper.base", __name__}
+        command = _encode_command(spec, modules)
+        data = {
+            "version": FORMAT_VERSION,
+            "key": key,
+            "sources": _source_stats(modules),
+            "command": command,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
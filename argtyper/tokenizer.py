@@ -0,0 +1,67 @@
+""" Split messages into arguments """
+
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Text, Tuple, Union
+
+# Characters which need the full POSIX rules of shlex: quotes, escapes and whitespace which shlex
+# does not split on (but str.split() does)
+_NEEDS_SHLEX = re.compile(
+    r"[\"'\\\x0b\x0c\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+)
+
+
+def split(message: Text) -> List[str]:
+    """Split a message into arguments, with the same result as :py:func:`shlex.split`
+
+    Messages without quotes or escapes are split with :py:meth:`str.split`, which is a lot faster.
+    """
+    if _NEEDS_SHLEX.search(message):
+        import shlex
+
+        return shlex.split(message)
+    return message.split()
+
+
+class Tokenizer:
+    """Split messages into arguments and optionally remember the results for recent messages
+
+    A tokenizer can be used from several threads.
+
+    Args:
+        cache_size: The number of recent messages to remember. ``0`` (default) disables the cache
+    """
+
+    def __init__(self, cache_size: int = 0):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, message: Union[Text, Sequence[str]]) -> List[str]:
+        """Return the arguments for a message
+
+        Args:
+            message: A string, or a sequence of already split arguments, which is returned as list
+        """
+        if not isinstance(message, str):
+            return list(message)
+        if not self.cache_size:
+            return split(message)
+
+        with self._lock:
+            tokens = self._cache.get(message, None)
+            if tokens is not None:
+                self._cache.move_to_end(message)
+                return list(tokens)
+        result = split(message)
+        with self._lock:
+            self._cache[message] = tuple(result)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """ Forget all remembered messages """
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,100 @@
+""" Measure the lookup of ArgTyper attributes for heavily decorated and wrapped functions
+
+Builds commands with many parameters (each with an Argument decorator), wrapped in several layers of
+``functools.wraps`` decorators, and compares resolving their attributes with and without the resolution cache.
+Also filters a large namespace for decorated functions with ``has_attribute``, compared with asking every
+attribute class.
+
+Run with ``python benchmarks/bench_attributes.py [number of parameters] [number of wrappers]``
+"""
+
+import functools
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+from argtyper.base import ArgTyperAttribute, Argument, Command  # noqa: E402
+from argtyper.registry import resolve  # noqa: E402
+
+
+def wrap(func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def make_command(parameters: int, wrappers: int) -> Callable:
+    namespace: dict = {}
+    signature = ", ".join(f"p{i:03d}: int = 0" for i in range(parameters))
+    exec(f"def command({signature}):\n    return None", namespace)
+    command = namespace["command"]
+    for i in range(parameters):
+        command = Argument(f"p{i:03d}", f"--param-{i}", help=f"Parameter {i}")(command)
+    command = argtyper.ArgumentGroup([f"p{i:03d}" for i in range(0, parameters, 2)])(command)
+    for _ in range(wrappers):
+        command = wrap(command)
+    return command
+
+
+def make_namespace(size: int) -> list:
+    """ A namespace of plain and decorated functions, like a large module """
+    functions = []
+    for i in range(size):
+        namespace: dict = {}
+        exec(f"def func{i}(value: int = 0):\n    return value", namespace)
+        func = namespace[f"func{i}"]
+        if i % 10 == 0:
+            func = argtyper.Command(description=f"Command {i}")(func)
+        functions.append(wrap(func) if i % 3 == 0 else func)
+    return functions
+
+
+def measure(name: str, func: Callable[[], object], rounds: int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    duration = time.perf_counter() - start
+    print(f"{name:>32}: {duration / rounds * 1e6:8.2f} us")
+
+
+def main(parameters: int = 100, wrappers: int = 5) -> None:
+    command = make_command(parameters, wrappers)
+    registry = Argument._registered_functions
+    print(f"{parameters} parameters, {wrappers} wrappers")
+    measure("resolve (walk the chain)", lambda: resolve(command, registry), 20000)
+    measure("Argument.get (cached)", lambda: Argument.get(command), 20000)
+    measure("get_all (cached)", lambda: ArgTyperAttribute.get_all(command), 20000)
+
+    def build(cached: bool) -> None:
+        if not cached:
+            ArgTyperAttribute._resolution_cache.clear()
+        argtyper.ArgTyper(command).get_parser()
+
+    measure("build parser (cache cleared)", lambda: build(False), 200)
+    measure("build parser (cached)", lambda: build(True), 200)
+    assert Command.get(command) is not None
+
+    namespace = make_namespace(5000)
+    subclasses = ArgTyperAttribute._get_all_subclasses
+
+    def scan_subclasses() -> list:
+        return [f for f in namespace if any(c.get(f) for c in subclasses())]
+
+    def scan_index() -> list:
+        return [f for f in namespace if ArgTyperAttribute.has_attribute(f)]
+
+    assert scan_subclasses() == scan_index()
+    print(f"{len(namespace)} functions, {len(scan_index())} decorated")
+    measure("scan (every attribute class)", scan_subclasses, 5)
+    measure("scan (has_attribute)", scan_index, 5)
+    measure("iter_registered", lambda: list(ArgTyperAttribute.iter_registered()), 5)
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
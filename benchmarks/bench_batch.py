@@ -0,0 +1,78 @@
+""" Compare the throughput of ArgTyper.call_many with calling the ArgTyper once per message,
+with the native parser and with a result cache
+
+Run with ``python benchmarks/bench_batch.py [number of messages]``
+"""
+
+import shlex
+import sys
+import time
+from pathlib import Path
+from typing import List, Literal, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+
+
+def show(item: str, amount: int = 1, verbose: bool = False):
+    return item, amount, verbose
+
+
+def tag(name: str, labels: List[str] = None, color: Literal["red", "green"] = "red"):
+    return name, labels, color
+
+
+def move(target: Tuple[int, int], fast: bool = False):
+    return target, fast
+
+
+@argtyper.SubCommand(show)
+@argtyper.SubCommand(tag)
+@argtyper.SubCommand(move)
+def bot(channel: str = "main"):
+    return channel
+
+
+MESSAGES = [
+    "show apple --amount 3",
+    "--channel dev tag issue --labels bug perf --color green",
+    "move 3 4 --fast",
+    "show pear --verbose",
+]
+
+
+def per_call(at: argtyper.ArgTyper, messages: List[str]) -> None:
+    for message in messages:
+        at(message)
+
+
+def batch(at: argtyper.ArgTyper, messages: List[str]) -> None:
+    at.call_many(messages)
+
+
+def main(count: int = 20000) -> None:
+    messages = (MESSAGES * (count // len(MESSAGES) + 1))[:count]
+    argvs = [shlex.split(message) for message in messages]
+    at = argtyper.ArgTyper(bot)
+    at.get_parser()
+    cached = argtyper.ArgTyper(bot, result_cache=len(MESSAGES))
+    cached.get_parser()
+    native = argtyper.ArgTyper(bot, native_parser=True)
+    native.get_parser()
+
+    for name, func, instance, data in [
+        ("per call", per_call, at, messages),
+        ("call_many", batch, at, messages),
+        ("call_many (argv lists)", batch, at, argvs),
+        ("call_many (native)", batch, native, messages),
+        ("call_many (cached)", batch, cached, messages),
+    ]:
+        start = time.perf_counter()
+        func(instance, data)
+        duration = time.perf_counter() - start
+        print(f"{name:>22}: {count / duration:10.0f} messages/s ({duration:.3f}s)")
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
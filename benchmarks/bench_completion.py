@@ -0,0 +1,124 @@
+""" Compare the latency of a static completion script with completing by starting Python
+
+For every case, bash runs the generated completion function with ``COMP_WORDS`` set up like a TAB press would.
+The static cases never leave bash, the dynamic case calls ``python -m argtyper.completion complete``. As a
+reference, the script also measures starting Python, importing the command and building its parser, which is what
+a completion implemented inside the program would pay on every TAB press.
+
+The completions are compared with the expected values, so the script also checks the generated bash script.
+
+Run with ``python benchmarks/bench_completion.py [--repeat N]``
+"""
+
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Literal, Tuple
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import argtyper  # noqa: E402
+from argtyper.completion import generate_script  # noqa: E402
+
+
+def hosts(prefix: str):
+    return [host for host in ("alpha", "beta", "gamma") if host.startswith(prefix)]
+
+
+@argtyper.Argument("host", completer=hosts)
+def deploy(
+    host: str,
+    mode: Literal["fast", "slow"] = "fast",
+    force: bool = False,
+    tags: List[str] = [],
+    size: Tuple[int, int] = (1, 1),
+):
+    return host, mode, force, tags, size
+
+
+def status(name: str, verbose: bool = False):
+    return name, verbose
+
+
+@argtyper.SubCommand(deploy)
+@argtyper.SubCommand(status)
+def tool(level: Literal["low", "high"] = "low", v: bool = False):
+    return level, v
+
+
+# (name, words, expected completions)
+CASES = [
+    ("subcommands", ["tool", ""], "status deploy"),
+    ("options", ["tool", "deploy", "alpha", "--"], "--help --mode --force --tags --size"),
+    ("choices", ["tool", "--level", "h"], "high"),
+    ("after list", ["tool", "deploy", "x", "--tags", "a", "b", "--m"], "--mode"),
+    ("after tuple", ["tool", "deploy", "x", "--size", "1", "2", "--f"], "--force"),
+    ("dynamic", ["tool", "deploy", "g"], "gamma"),
+]
+
+RUNNER = """
+source "$1"
+shift
+repeat=$1
+shift
+COMP_WORDS=("$@")
+COMP_CWORD=$((${#COMP_WORDS[@]} - 1))
+start=$EPOCHREALTIME
+for ((n = 0; n < repeat; n++)); do
+    COMPREPLY=()
+    _argtyper_tool
+done
+end=$EPOCHREALTIME
+echo "${COMPREPLY[*]}"
+echo $(( (${end/./} - ${start/./}) / repeat ))
+"""
+
+PARSER_SCRIPT = "import bench_completion, argtyper; argtyper.ArgTyper(bench_completion.tool).get_parser()"
+
+
+def run_case(script: str, words: List[str], repeat: int) -> Tuple[str, float]:
+    """ Run the completion function ``repeat`` times and return the completions and the mean time in us """
+    output = subprocess.run(
+        ["bash", "-c", RUNNER, "bash", script, str(repeat), *words],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT), str(Path(__file__).parent)])),
+    ).stdout.splitlines()
+    return output[0], float(output[1])
+
+
+def measure_parser(repeat: int) -> float:
+    """ The mean time in us for starting Python, importing the command and creating its parser """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT), str(Path(__file__).parent)]))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        subprocess.run([sys.executable, "-c", PARSER_SCRIPT], check=True, env=env)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(repeat: int = 20) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "tool.bash")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(generate_script(tool, "bash", prog="tool", target="bench_completion:tool"))
+
+        failures = 0
+        print(f"{'case':<14}{'us per TAB':>12}  completions")
+        for name, words, expected in CASES:
+            # The dynamic case starts Python every time, so fewer repetitions are enough
+            completions, us = run_case(script, words, max(1, repeat // 10) if name == "dynamic" else repeat)
+            ok = completions.split() == expected.split()
+            failures += not ok
+            print(f"{name:<14}{us:>12.1f}  {completions}{'' if ok else f'  (expected {expected})'}")
+        print(f"{'python parser':<14}{measure_parser(max(1, repeat // 10)):>12.1f}  {shlex.quote(PARSER_SCRIPT)}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(argtyper.ArgTyper(main)(return_responses=True)[0])
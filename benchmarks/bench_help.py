@@ -0,0 +1,70 @@
+""" Compare rendering help and usage messages of a large command with the memoized and the cached messages
+
+Run with ``python benchmarks/bench_help.py [number of options] [number of subcommands]``
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+
+
+def make_command(options: int, subcommands: int) -> Callable:
+    namespace: dict = {}
+    parameters = ", ".join(f"option{i:04d}: int = {i}" for i in range(options))
+    exec(f"def big({parameters}):\n    return None", namespace)
+    command = namespace["big"]
+    for i in range(subcommands):
+        exec(f"def cmd{i:04d}(value: int = 0, name: str = 'x'):\n    return value", namespace)
+        command = argtyper.SubCommand(namespace[f"cmd{i:04d}"])(command)
+    return command
+
+
+def measure(name: str, func: Callable[[], object], rounds: int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    duration = time.perf_counter() - start
+    print(f"{name:>36}: {duration / rounds * 1e6:10.1f} us")
+
+
+def main(options: int = 300, subcommands: int = 100) -> None:
+    command = make_command(options, subcommands)
+    print(f"{options} options, {subcommands} subcommands")
+
+    def first_help() -> None:
+        argtyper.ArgTyper(command).get_parser().format_help()
+
+    def build() -> None:
+        argtyper.ArgTyper(command).get_parser()
+
+    measure("build parser", build, 20)
+    measure("build parser and render help", first_help, 20)
+    parser = argtyper.ArgTyper(command).get_parser()
+    measure("format_help (memoized)", parser.format_help, 2000)
+    measure("format_usage (memoized)", parser.format_usage, 2000)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "spec.json")
+        # Writes the cache file, including the help messages
+        argtyper.ArgTyper(command, spec_cache=path, cache_help=True).get_parser()
+
+        def cached_help(cache_help: bool) -> Callable[[], None]:
+            def run() -> None:
+                at = argtyper.ArgTyper(command, spec_cache=path, cache_help=cache_help)
+                at.get_parser().format_help()
+
+            return run
+
+        measure("spec cache, build and render help", cached_help(False), 20)
+        measure("spec cache with help, build and help", cached_help(True), 20)
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
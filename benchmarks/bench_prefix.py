@@ -0,0 +1,60 @@
+""" Compare the indexed lookup of abbreviated options with the linear scan of argparse
+
+Builds a command with many options and subcommands and parses abbreviated options and subcommand prefixes.
+
+Run with ``python benchmarks/bench_prefix.py [number of options] [number of subcommands]``
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+from argtyper.native import NativeParser  # noqa: E402
+
+
+def make_command(options: int, subcommands: int) -> Callable:
+    namespace: dict = {}
+    parameters = ", ".join(f"opt{i:04d}x: int = 0" for i in range(options))
+    exec(f"def big({parameters}):\n    return None", namespace)
+    command = namespace["big"]
+    for i in range(subcommands):
+        exec(f"def cmd{i:04d}x(value: int = 0):\n    return value", namespace)
+        command = argtyper.SubCommand(namespace[f"cmd{i:04d}x"])(command)
+    return command
+
+
+def measure(name: str, func: Callable[[], object], rounds: int = 2000) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    duration = time.perf_counter() - start
+    print(f"{name:>32}: {duration / rounds * 1e6:8.1f} us")
+
+
+def main(options: int = 300, subcommands: int = 150) -> None:
+    command = make_command(options, subcommands)
+    parser = argtyper.ArgTyper(command, subcommand_prefixes=True).get_parser()
+    abbreviation = f"--opt{options // 2:04d}"
+    args = [abbreviation, "1", f"cmd{subcommands // 2:04d}x", "--value", "2"]
+    prefix_args = [abbreviation, "1", f"cmd{subcommands // 2:04d}x"[:-1], "--value", "2"]
+    assert parser.parse_args(args) == parser.parse_args(prefix_args)
+
+    print(f"{options} options, {subcommands} subcommands")
+    measure(
+        "option lookup (argparse)",
+        lambda: ArgumentParser._get_option_tuples(parser, abbreviation),
+    )
+    measure("option lookup (index)", lambda: parser._get_option_tuples(abbreviation))
+    measure("parse (full names)", lambda: parser.parse_args(args))
+    measure("parse (subcommand prefix)", lambda: parser.parse_args(prefix_args))
+    native = NativeParser(parser)
+    measure("native (subcommand prefix)", lambda: native.parse_args(prefix_args))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
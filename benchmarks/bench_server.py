@@ -0,0 +1,83 @@
+""" Compare the latency of running a command directly with running it through argtyper.server
+
+Run with ``python benchmarks/bench_server.py [number of invocations]``
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+COMMAND = textwrap.dedent(
+    """
+    import argtyper
+    from typing import List, Literal
+
+
+    def show(item: str, amount: int = 1, verbose: bool = False):
+        print(item * amount)
+
+
+    def tag(name: str, labels: List[str] = None, color: Literal["red", "green"] = "red"):
+        print(name, labels, color)
+
+
+    @argtyper.SubCommand(show)
+    @argtyper.SubCommand(tag)
+    def cli(channel: str = "main"):
+        pass
+
+
+    at = argtyper.ArgTyper(cli)
+
+    if __name__ == "__main__":
+        at()
+    """
+)
+
+ARGS = ["tag", "issue", "--labels", "bug", "perf", "--color", "green"]
+
+
+def measure(command, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / count
+
+
+def main(count: int = 50) -> None:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    with tempfile.TemporaryDirectory() as tmp:
+        script = Path(tmp) / "cli.py"
+        script.write_text(COMMAND)
+        socket_path = Path(tmp) / "cli.sock"
+        launcher = Path(tmp) / "cli-client"
+
+        direct = measure([sys.executable, str(script)] + ARGS, count)
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "argtyper.server", "cli:at", str(socket_path)]
+            + ["--write-client", str(launcher)],
+            cwd=tmp,
+            env=env,
+        )
+        try:
+            while not socket_path.exists():
+                time.sleep(0.01)
+            daemon = measure([str(launcher)] + ARGS, count)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"direct: {direct * 1000:7.1f} ms/invocation")
+    print(f"daemon: {daemon * 1000:7.1f} ms/invocation")
+
+
+if __name__ == "__main__":
+    os.environ["PYTHONPATH"] = str(ROOT)
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,124 @@
+""" Share one ArgTyper instance between threads and measure how the throughput scales with the number of threads
+
+Every thread parses and calls a mix of messages (including help and error messages) with the same instance and
+compares every result with the result of a single threaded run, so the script also checks that parsing is
+reentrant. The instance is created lazily (``lazy_subcommands=True``), so the first calls of the threads race to
+build the parser and its subcommands.
+
+Throughput only scales with the number of threads on a free-threaded build of Python (``python3.13t``).
+With the GIL, the numbers show the overhead of sharing the instance instead.
+
+Run with ``python benchmarks/bench_threads.py [messages per thread] [max. number of threads]``
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Literal, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+from argtyper.exceptions import ArgParserException, ArgParserExitException  # noqa: E402
+
+
+def show(item: str, amount: int = 1, verbose: bool = False):
+    return item, amount, verbose
+
+
+@argtyper.Argument("labels", "--labels", nargs="*")
+@argtyper.MutuallyExclusiveArgumentGroup(["fast", "slow"])
+def tag(
+    name: str,
+    labels: List[str] = None,
+    color: Literal["red", "green"] = "red",
+    fast: bool = False,
+    slow: bool = False,
+):
+    return name, labels, color
+
+
+def move(target: Tuple[int, int], fast: bool = False):
+    return target, fast
+
+
+@argtyper.SubCommand(show)
+@argtyper.SubCommand(tag)
+@argtyper.SubCommand(move)
+def bot(channel: str = "main"):
+    return channel
+
+
+MESSAGES = [
+    "show apple --amount 3",
+    "--channel dev tag issue --labels bug perf --color green --fast",
+    "move 3 4 --fast",
+    "show --help",
+    "tag issue --fast --slow",
+    "move 3",
+    "--help",
+]
+
+CONFIGS: Dict[str, dict] = {
+    "argparse": dict(lazy_subcommands=True),
+    "native": dict(lazy_subcommands=True, native_parser=True),
+    "cached": dict(lazy_subcommands=True, result_cache=64, tokenizer_cache=64),
+}
+
+
+def outcome(at: argtyper.ArgTyper, message: str):
+    try:
+        return "ok", at(message)
+    except ArgParserExitException as exc:
+        return "exit", exc.status, exc.output
+    except ArgParserException as exc:
+        return "error", str(exc), exc.output
+
+
+def run_threads(
+    at: argtyper.ArgTyper, threads: int, rounds: int, expected: Dict[str, tuple]
+) -> Tuple[float, int]:
+    barrier = threading.Barrier(threads + 1)
+    failures: List[int] = [0] * threads
+
+    def worker(number: int) -> None:
+        barrier.wait()
+        for i in range(rounds):
+            message = MESSAGES[(i + number) % len(MESSAGES)]
+            if outcome(at, message) != expected[message]:
+                failures[number] += 1
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, sum(failures)
+
+
+def main(rounds: int = 2000, max_threads: int = 8) -> int:
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    reference = argtyper.ArgTyper(bot)
+    expected = {message: outcome(reference, message) for message in MESSAGES}
+
+    failures = 0
+    for name, config in CONFIGS.items():
+        line = []
+        for threads in [1, 2, 4, 8, 16, 32]:
+            if threads > max_threads:
+                break
+            at: Callable = argtyper.ArgTyper(bot, **config)
+            duration, failed = run_threads(at, threads, rounds, expected)
+            failures += failed
+            line.append(f"{threads:>2}: {threads * rounds / duration:8.0f}/s")
+        print(f"{name:>10}  " + "  ".join(line))
+    print(f"{failures} results differ from a single threaded run")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*[int(x) for x in sys.argv[1:3]]))
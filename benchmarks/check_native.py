@@ -0,0 +1,167 @@
+""" Compare argtyper.native.NativeParser with argparse on random argument lists, and compare their speed
+
+Every argument list is parsed by both engines. The script reports every argument list for which the namespaces,
+or the type and message of the raised exceptions, differ. The indexed lookup of abbreviated options
+(ArgParser._get_option_tuples) is compared with the linear scan of argparse as well.
+
+Run with ``python benchmarks/check_native.py [number of argument lists per command] [seed]``
+"""
+
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from enum import Enum
+from pathlib import Path
+from typing import Callable, List, Literal, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+from argtyper.native import NativeParser  # noqa: E402
+
+
+class Color(Enum):
+    red = "red"
+    green = "green"
+
+
+def make_commands():
+    """ Define new functions for every configuration, so every parser is built from scratch """
+
+    def show(item: str, amount: int = 1, verbose: bool = False, ratio: float = 0.5):
+        return item, amount, verbose
+
+    @argtyper.Argument("labels", "--labels", "-l", nargs="*")
+    def tag(
+        name: str, labels: List[str] = None, color: Literal["red", "green"] = "red"
+    ):
+        return name, labels, color
+
+    def move(target: Tuple[int, int], fast: bool = False, color: Color = Color.red):
+        return target, fast
+
+    @argtyper.MutuallyExclusiveArgumentGroup(["alpha", "beta"])
+    @argtyper.ArgumentGroup(["gamma"], title="Gamma")
+    def pick(
+        first: int, second: str, alpha: bool = False, beta: bool = False, gamma: str = "g"
+    ):
+        return first, second
+
+    @argtyper.SubCommand(show)
+    @argtyper.SubCommand(tag)
+    def inner(level: int = 0):
+        return level
+
+    @argtyper.SubCommand(show)
+    @argtyper.SubCommand(tag)
+    @argtyper.SubCommand(move)
+    @argtyper.SubCommand(pick)
+    @argtyper.SubCommand(inner)
+    def bot(channel: str = "main", dry: bool = False, n: int = 3):
+        return channel
+
+    return {"bot": bot, "show": show, "pick": pick}
+
+
+COMMANDS = {
+    "bot": lambda: dict(func=make_commands()["bot"], version="1.0"),
+    "bot (lazy)": lambda: dict(func=make_commands()["bot"], lazy_subcommands=True),
+    "bot (prefix)": lambda: dict(func=make_commands()["bot"], subcommand_prefixes=True),
+    "show": lambda: dict(func=make_commands()["show"]),
+    "pick": lambda: dict(func=make_commands()["pick"]),
+}
+
+VALUES = ["1", "2", "-1", "-2.5", "x", "a b", "true", "no", "red", "green", "", "-", "--", "-x", "--unknown"]
+
+
+def collect_tokens(parser: ArgumentParser, tokens: set) -> None:
+    for option_string in parser._option_string_actions:
+        tokens.add(option_string)
+        tokens.add(option_string + "=1")
+        tokens.add(option_string[:3])
+        if option_string.startswith("--") and len(option_string) > 3:
+            tokens.add(option_string[:-1])
+            tokens.add(option_string[:-1] + "=1")
+    for action in parser._actions:
+        for name, subparser in getattr(action, "_name_parser_map", {}).items():
+            tokens.add(name)
+            tokens.add(name[:1])
+            tokens.add(name[:2])
+            collect_tokens(subparser, tokens)
+
+
+def check_option_tuples(parser: ArgumentParser, vocabulary: List[str]) -> int:
+    failures = 0
+    for token in vocabulary:
+        if len(token) < 2 or token[0] not in parser.prefix_chars:
+            continue
+        expected = ArgumentParser._get_option_tuples(parser, token)
+        if parser._get_option_tuples(token) != expected:
+            failures += 1
+            print(f"  option tuples for {token!r} differ")
+    for action in parser._actions:
+        for subparser in getattr(action, "_name_parser_map", {}).values():
+            failures += check_option_tuples(subparser, vocabulary)
+    return failures
+
+
+def outcome(parse, args: List[str]):
+    try:
+        return "ok", vars(parse(list(args)))
+    except Exception as exc:
+        return "error", type(exc).__name__, str(exc)
+
+
+def check(name: str, config: Callable[[], dict], count: int, rng: random.Random) -> int:
+    at = argtyper.ArgTyper(**config())
+    parser = at.get_parser()
+    native = NativeParser(parser)
+    tokens: set = set(VALUES)
+    collect_tokens(parser, tokens)
+    vocabulary = sorted(tokens)
+
+    failures = check_option_tuples(parser, vocabulary)
+    valid = 0
+    for _ in range(count):
+        args = [rng.choice(vocabulary) for _ in range(rng.randint(0, 7))]
+        expected = outcome(parser.parse_args, args)
+        result = outcome(native.parse_args, args)
+        if expected[0] == "ok":
+            valid += 1
+        if result != expected:
+            failures += 1
+            if failures <= 10:
+                print(f"  {name}: {args!r}\n    argparse: {expected}\n    native:   {result}")
+    print(f"{name:>12}: {count} argument lists ({valid} valid), {failures} differences")
+    return failures
+
+
+def timing() -> None:
+    messages = [
+        ["show", "apple", "--amount", "3"],
+        ["--channel", "dev", "tag", "issue", "--labels", "bug", "perf", "--color", "green"],
+        ["move", "3", "4", "--fast"],
+        ["pick", "1", "two", "--alpha"],
+    ]
+    parser = argtyper.ArgTyper(make_commands()["bot"]).get_parser()
+    native = NativeParser(parser)
+    for engine, parse in [("argparse", parser.parse_args), ("native", native.parse_args)]:
+        rounds = 5000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for args in messages:
+                parse(args)
+        duration = time.perf_counter() - start
+        print(f"{engine:>12}: {duration / rounds / len(messages) * 1e6:6.1f} us per argument list")
+
+
+def main(count: int = 20000, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    failures = sum(check(name, config, count, rng) for name, config in COMMANDS.items())
+    timing()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*[int(x) for x in sys.argv[1:3]]))
@@ -0,0 +1,105 @@
+""" Check that command functions created and discarded over and over again do not leak memory
+
+Every cycle defines the commands of a new "tenant" (decorated functions and a class with decorated methods),
+creates an ArgTyper for them, runs a few invocations and drops everything again. After a warm-up, the size of the
+attribute registries, the number of cached parsers and the memory allocated by Python must stay flat.
+The cycles are run without and with ``cache_parser=True``. The parser cache keeps the commands of its entries alive,
+so it must not grow beyond its ``maxsize``, and after clearing it no registered function may be left.
+
+Run with ``python benchmarks/soak_registry.py [number of cycles]``
+"""
+
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+from argtyper.base import ArgTyperAttribute  # noqa: E402
+from argtyper.cache import parser_cache  # noqa: E402
+
+# Growth (in bytes) tolerated between the first and the second half of the measured cycles
+TOLERANCE = 64 * 1024
+
+
+def make_tenant(tenant: int):
+    def show(item: str, amount: int = 1):
+        return tenant, item, amount
+
+    @argtyper.Argument("labels", "--labels", nargs="*")
+    @argtyper.ArgumentGroup(["color"], title="Colors")
+    @argtyper.MutuallyExclusiveArgumentGroup(["fast", "slow"])
+    def tag(name: str, labels: list = None, color: str = "red", fast: bool = False, slow: bool = False):
+        return tenant, name, labels
+
+    class Shop:
+        @argtyper.Command(description=f"Shop of tenant {tenant}")
+        @argtyper.SubParser(title="actions")
+        @argtyper.SubCommand("buy")
+        def run(self, verbose: bool = False):
+            return tenant
+
+        def buy(self, item: str):
+            return tenant, item
+
+    @argtyper.Command(description=f"Commands of tenant {tenant}")
+    @argtyper.SubCommand(show)
+    @argtyper.SubCommand(tag)
+    def bot(channel: str = "main"):
+        return channel
+
+    return bot, Shop().run
+
+
+def cycle(tenant: int, cache_parser: bool) -> None:
+    bot, run = make_tenant(tenant)
+    at = argtyper.ArgTyper(bot, cache_parser=cache_parser)
+    at("show apple --amount 3")
+    at.call_many(["tag issue --labels bug --fast", "show pear"])
+    # The bound method is looked up through its function (__func__)
+    argtyper.ArgTyper(run, cache_parser=cache_parser)("buy milk")
+
+
+def registered() -> int:
+    classes = ArgTyperAttribute._get_all_subclasses() | {ArgTyperAttribute}
+    return sum(len(cls._registered_functions) for cls in classes)
+
+
+def measure(cycles: int, start: int, cache_parser: bool) -> int:
+    for tenant in range(start, start + cycles):
+        cycle(tenant, cache_parser)
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def soak(cycles: int, cache_parser: bool) -> int:
+    baseline = registered()
+    warmup = parser_cache.maxsize * 2
+    measure(warmup, 0, cache_parser)
+    first = measure(cycles // 2, warmup, cache_parser)
+    second = measure(cycles // 2, warmup + cycles // 2, cache_parser)
+    growth = second - first
+    cached = len(parser_cache)
+    parser_cache.invalidate()
+    gc.collect()
+    leaked = registered() - baseline
+
+    print(f"{cycles} cycles after {warmup} warm-up cycles (cache_parser={cache_parser})")
+    print(f"  registered functions: {leaked} more than before")
+    print(f"  cached parsers: {cached}")
+    print(f"  traced memory: {first / 1024:.0f} KiB -> {second / 1024:.0f} KiB ({growth / 1024:+.1f} KiB)")
+    if leaked > 0 or cached > parser_cache.maxsize or growth > TOLERANCE:
+        print("memory is not flat")
+        return 1
+    return 0
+
+
+def main(cycles: int = 2000) -> int:
+    tracemalloc.start()
+    return soak(cycles, False) | soak(cycles, True)
+
+
+if __name__ == "__main__":
+    sys.exit(main(*[int(x) for x in sys.argv[1:2]]))
@@ -0,0 +1,348 @@
+""" Benchmark ArgTyper on synthetic command trees
+
+Every scenario generates a command tree with a given number of parameters per command, number of subcommands per
+command (fan-out) and depth, with parameter types taken from a mix of ``int``, ``str``, ``bool``, ``List``,
+``Tuple`` and ``Literal``. For every scenario, the suite measures
+
+- ``build_ms``: creating the ArgTyper and its parser (``get_parser``), with and without lazy subcommands
+- ``parse_us``: ``get_function_calls`` for an invocation of the deepest command
+- ``call_sync_us`` / ``call_async_us``: ``call_parser_sync`` / ``call_parser_async`` for the same invocation
+- ``dispatch_sync_us`` / ``dispatch_async_us``: the part of these calls after parsing, i.e. mapping the parsed
+  arguments to the function calls and calling the (empty) functions
+- ``peak_kib``: the peak memory allocated while building the parser
+
+as well as the time to import argtyper (``import_ms``, measured with ``-X importtime`` in a new interpreter).
+Results are written as JSON, and can be compared with the results of an earlier run.
+
+The import time is checked against a budget (``--import_budget``, in ms), and ``import argtyper`` must not import
+any of the ``LAZY_MODULES``, which are only imported once they are needed. If either check fails, the exit status
+is 1.
+
+Run with ``python benchmarks/suite.py [--output results.json] [--baseline baseline.json] [--quick]``
+"""
+
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argtyper  # noqa: E402
+
+# Measured around 25 ms on a current machine with Python 3.11, of which argparse takes about 10 ms
+IMPORT_BUDGET_MS = 40.0
+
+# Modules which are only imported when they are used (asyncio for coroutines, shlex for messages with quotes,
+# json and hashlib for the spec cache, inspect to create a parser, shutil to show help messages)
+LAZY_MODULES = {"asyncio", "concurrent.futures", "hashlib", "inspect", "json", "shlex", "shutil"}
+
+# Prints the modules which are imported by argtyper (and were not imported at startup already)
+IMPORT_SCRIPT = "import sys; before = set(sys.modules); import argtyper; print(*set(sys.modules) - before)"
+
+# name -> parameters per command, fan-out, depth, type mix
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "flat-small": dict(params=5, fanout=0, depth=0, mix="int,str,bool,list,tuple,literal"),
+    "flat-wide": dict(params=200, fanout=0, depth=0, mix="int,str,bool,list,tuple,literal"),
+    "tree-wide": dict(params=8, fanout=40, depth=1, mix="int,str,bool,list,tuple,literal"),
+    "tree-deep": dict(params=6, fanout=3, depth=4, mix="int,str,bool,list,tuple,literal"),
+    "bools": dict(params=50, fanout=4, depth=1, mix="bool"),
+    "sequences": dict(params=50, fanout=4, depth=1, mix="list,tuple"),
+    "literals": dict(params=50, fanout=4, depth=1, mix="literal"),
+}
+
+ANNOTATIONS = {
+    "int": ("int", "3", ["7"]),
+    "str": ("str", "'x'", ["word"]),
+    "bool": ("bool", "False", []),
+    "list": ("List[int]", "None", ["1", "2", "3"]),
+    "tuple": ("Tuple[int, int]", "None", ["4", "5"]),
+    "literal": ("Literal['red', 'green', 'blue']", "'red'", ["green"]),
+}
+
+
+class Tree:
+    """A generated command tree
+
+    Args:
+        params: Number of parameters of every command. Every fifth parameter is positional (``int`` or ``str``)
+        fanout: Number of subcommands of every command, which is not at the maximum depth
+        depth: Number of levels of subcommands
+        mix: Comma separated names of the parameter types (see ``ANNOTATIONS``), used in turns
+        coroutines: Create ``async`` functions
+    """
+
+    def __init__(
+        self, params: int, fanout: int, depth: int, mix: str, coroutines: bool = False
+    ):
+        self.kinds = mix.split(",")
+        self.params = params
+        self.fanout = fanout
+        self.depth = depth
+        self.coroutines = coroutines
+        self.commands = 0
+        self.root = self._make("root", depth)
+        # The invocation of the deepest (last) command
+        self.args: List[str] = []
+        for level in range(depth + 1):
+            self.args += self._command_args()
+            if level < depth and fanout:
+                self.args.append(f"cmd_{level + 1}_{fanout - 1}")
+
+    def _parameters(self) -> List[Tuple[str, str, Optional[str]]]:
+        """ (name, annotation, default) of the parameters of every command, positional parameters first """
+        positionals, options = [], []
+        for i in range(self.params):
+            if i % 5 == 0:
+                kind = "int" if i % 10 == 0 else "str"
+                positionals.append((f"pos{i}", ANNOTATIONS[kind][0], None))
+                continue
+            kind = self.kinds[i % len(self.kinds)]
+            annotation, default, _ = ANNOTATIONS[kind]
+            options.append((f"p{i}_{kind}", annotation, default))
+        return positionals + options
+
+    def _command_args(self) -> List[str]:
+        """ The arguments for one command: all positionals and every other option """
+        positionals, lists, others = [], [], []
+        for i, (name, annotation, default) in enumerate(self._parameters()):
+            if default is None:
+                positionals.append("7" if annotation == "int" else "word")
+            elif i % 2:
+                kind = name.rsplit("_", 1)[1]
+                (lists if kind == "list" else others).append([f"--{name}"] + ANNOTATIONS[kind][2])
+        # Options with a variable number of values have to be followed by another option,
+        # otherwise they would consume the name of the subcommand
+        return positionals + [arg for option in lists + others for arg in option]
+
+    def _make(self, name: str, levels: int) -> Callable:
+        self.commands += 1
+        signature = ", ".join(
+            f"{param}: {annotation}" + (f" = {default}" if default is not None else "")
+            for param, annotation, default in self._parameters()
+        )
+        namespace: Dict[str, Any] = {"List": List, "Tuple": Tuple, "Literal": Literal}
+        prefix = "async " if self.coroutines else ""
+        exec(f"{prefix}def {name}({signature}):\n    return {name!r}", namespace)
+        func = namespace[name]
+        if levels and self.fanout:
+            level = self.depth - levels + 1
+            for i in range(self.fanout):
+                subfunc = self._make(f"cmd_{level}_{i}", levels - 1)
+                func = argtyper.SubCommand(subfunc)(func)
+        return func
+
+
+def repeated(func: Callable[[], Any]) -> Callable[[int], None]:
+    """ Turn ``func`` into a function, which calls it a given number of times """
+
+    def run(rounds: int) -> None:
+        for _ in range(rounds):
+            func()
+
+    return run
+
+
+def per_call(funcs: List[Callable[[int], Any]], rounds: int, repeat: int) -> List[float]:
+    """The time of a single call in seconds, for every function which makes ``rounds`` calls
+
+    The runs of the functions are interleaved, and the fastest out of ``repeat`` runs counts, so differences
+    between the functions are not distorted by changes in the load of the machine.
+    """
+    times: List[List[float]] = [[] for _ in funcs]
+    for _ in range(repeat):
+        for func, results in zip(funcs, times):
+            start = time.perf_counter()
+            func(rounds)
+            results.append((time.perf_counter() - start) / rounds)
+    return [min(results) for results in times]
+
+
+def measure_import(repeat: int) -> Tuple[float, List[str]]:
+    """Measure ``import argtyper`` with ``-X importtime``
+
+    Returns:
+        The median of the cumulative import time of argtyper in ms, and the modules imported by argtyper
+    """
+    root = str(Path(__file__).parent.parent)
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times = []
+    modules: List[str] = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        modules = result.stdout.split()
+        for line in result.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "argtyper":
+                times.append(int(fields[1]) / 1000)
+    return statistics.median(times), modules
+
+
+def measure_scenario(config: Dict[str, Any], quick: bool) -> Dict[str, Any]:
+    repeat = 3 if quick else 7
+    tree = Tree(**config)
+    build_rounds = max(1, 200 // tree.commands) if quick else max(2, 1000 // tree.commands)
+
+    def build(lazy: bool) -> Callable[[], Any]:
+        return lambda: argtyper.ArgTyper(tree.root, lazy_subcommands=lazy).get_parser()
+
+    at = argtyper.ArgTyper(tree.root)
+    at.get_parser()
+    rounds = 200 if quick else 1000
+    async_tree = Tree(**config, coroutines=True)
+    async_at = argtyper.ArgTyper(async_tree.root)
+    async_at.get_parser()
+
+    async def calls_async(count: int) -> None:
+        for _ in range(count):
+            await async_at.call_parser_async(async_tree.args)
+
+    # Dispatching: mapping the parsed arguments to the function calls, and calling the functions
+    parsed = vars(at._parse_args(tree.args))
+    async_parsed = vars(async_at._parse_args(async_tree.args))
+
+    def dispatch_sync() -> None:
+        at._run_calls_sync(at.dispatch_plan.get_function_calls(tree.root, parsed))
+
+    async def dispatch_async(count: int) -> None:
+        for _ in range(count):
+            calls = async_at.dispatch_plan.get_function_calls(async_tree.root, async_parsed)
+            for func, kwargs in calls:
+                await async_at._call_async(func, kwargs)
+
+    parse, call_sync, call_async, dispatch, dispatch_coroutines = per_call(
+        [
+            repeated(lambda: at.get_function_calls(tree.args)),
+            repeated(lambda: at.call_parser_sync(tree.args)),
+            # One event loop for all rounds
+            lambda count: asyncio.run(calls_async(count)),
+            repeated(dispatch_sync),
+            lambda count: asyncio.run(dispatch_async(count)),
+        ],
+        rounds,
+        repeat,
+    )
+    build_eager, build_lazy = per_call(
+        [repeated(build(False)), repeated(build(True))], build_rounds, repeat
+    )
+
+    tracemalloc.start()
+    build(False)()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "config": config,
+        "commands": tree.commands,
+        "args": len(tree.args),
+        "build_ms": build_eager * 1e3,
+        "build_lazy_ms": build_lazy * 1e3,
+        "parse_us": parse * 1e6,
+        "call_sync_us": call_sync * 1e6,
+        "call_async_us": call_async * 1e6,
+        "dispatch_sync_us": dispatch * 1e6,
+        "dispatch_async_us": dispatch_coroutines * 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """ Print the ratio of every metric to the baseline (< 1 is faster or smaller) """
+    print(f"\nCompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('date')})")
+    print(f"{'import_ms':>32}: {results['import_ms'] / baseline['import_ms']:6.2f}x")
+    for name, metrics in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old or old["config"] != metrics["config"]:
+            continue
+        ratios = [
+            f"{key}={value / old[key]:.2f}x"
+            for key, value in metrics.items()
+            if key.endswith(("_ms", "_us", "_kib")) and old.get(key, 0) > 0 and value > 0
+        ]
+        print(f"{name:>32}: " + " ".join(ratios))
+
+
+def main(
+    output: str = "",
+    baseline: str = "",
+    scenarios: List[str] = None,
+    quick: bool = False,
+    import_budget: float = IMPORT_BUDGET_MS,
+) -> int:
+    """Run the benchmark suite
+
+    Args:
+        output: Write the results as JSON to this file
+        baseline: Compare the results with the JSON results of an earlier run
+        scenarios: Only run these scenarios
+        quick: Fewer rounds, for a fast (but less precise) overview
+        import_budget: Maximum import time of argtyper in ms
+    """
+    selected = scenarios or list(SCENARIOS)
+    import_ms, modules = measure_import(3 if quick else 9)
+    eager = sorted(LAZY_MODULES.intersection(modules))
+    results: Dict[str, Any] = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "import_ms": import_ms,
+        "import_budget_ms": import_budget,
+        "import_eager_modules": eager,
+        "scenarios": {},
+    }
+    print(f"{'import_ms':>32}: {import_ms:8.2f} (budget {import_budget:.0f})")
+    if eager:
+        print(f"{'imported too early':>32}: {', '.join(eager)}")
+    for name in selected:
+        metrics = measure_scenario(SCENARIOS[name], quick)
+        results["scenarios"][name] = metrics
+        print(
+            f"{name:>12} ({metrics['commands']:>3} commands): build {metrics['build_ms']:8.2f} ms"
+            f" (lazy {metrics['build_lazy_ms']:7.2f})  parse {metrics['parse_us']:8.1f} us"
+            f"  dispatch {metrics['dispatch_sync_us']:6.1f} / {metrics['dispatch_async_us']:6.1f} us"
+            f"  peak {metrics['peak_kib']:8.0f} KiB"
+        )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 1 if import_ms > import_budget or eager else 0
+
+
+if __name__ == "__main__":
+    sys.exit(argtyper.ArgTyper(main)(return_responses=True)[0])
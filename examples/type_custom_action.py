@@ -1,4 +1,4 @@
-from argtyper.base import remove_uuid4_prefix
+from argtyper.base import remove_dest_prefix
 import argtyper
 import argparse
 
@@ -14,7 +14,7 @@ class CustomAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         print("Parsing custom action: %r %r %r" % (namespace, values, option_string))
         setattr(namespace, self.dest, values)
-        print(f"Argument Name: {argtyper.base.remove_uuid4_prefix(self.dest)}")
+        print(f"Argument Name: {remove_dest_prefix(self.dest)}")
         print("------\nAction parsing finished\n-----\n")
 
 